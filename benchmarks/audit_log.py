@@ -0,0 +1,36 @@
+# Benchmark OceanAuditLogger with direct and buffered writes
+# Usage: python benchmarks/audit_log.py [events]
+
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceanaudit import OceanAuditLogger  # noqa: E402
+
+
+def run(events, buffered):
+    with tempfile.TemporaryDirectory() as tmp:
+        audit = OceanAuditLogger(os.path.join(tmp, "audit.log"), buffered=buffered)
+        start = time.perf_counter()
+        for i in range(events):
+            audit.log_action("ratelimit", f"user{i % 100}", "User hit rate limit")
+        logged = time.perf_counter() - start
+        # Include the time to get everything on disk
+        audit.close()
+        total = time.perf_counter() - start
+        return events / logged, events / total
+
+
+if __name__ == "__main__":
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    for buffered in (False, True):
+        logged, total = run(events, buffered)
+        print(
+            f"buffered={buffered!s:<5} {logged:>10.0f} events/sec on the caller, "
+            f"{total:>10.0f} events/sec including the final flush"
+        )
@@ -0,0 +1,150 @@
+# Benchmark broadcasting posts to many local websocket clients
+# Compares cloudlink's per-client serializing multicast with Broadcaster.
+# The clients run in a subprocess. Stalled clients complete the handshake
+# on a raw socket with tiny buffers and then never read, so the server's
+# sends to them back up. Needs the websockets version cloudlink runs on (<11).
+# Usage: python benchmarks/broadcast_fanout.py [clients] [broadcasts] [stalled]
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from cloudlink import server as cloudlink_server  # noqa: E402
+from broadcast import Broadcaster  # noqa: E402
+
+PORT = 3990
+HANDSHAKE = (
+    "GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\n"
+    "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+    "Sec-WebSocket-Version: 13\r\n\r\n"
+).encode()
+
+
+def rpost(i):
+    return {
+        "cmd": "gmsg",
+        "val": {
+            "cmd": "rpost",
+            "val": {
+                "author": "bench",
+                "post_content": os.urandom(100).hex(),
+                "uid": f"{i:032d}",
+                "attachment": "",
+            },
+        },
+    }
+
+
+def run_clients(port, clients, stalled):
+    async def main():
+        # Stalled clients connect first so the server can tell them apart
+        raw = []
+        for _ in range(stalled):
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+            sock.connect(("127.0.0.1", port))
+            sock.sendall(HANDSHAKE)
+            sock.recv(1024)
+            raw.append(sock)
+        for _ in range(clients):
+            ws = await websockets.connect(f"ws://127.0.0.1:{port}")
+            asyncio.create_task(drain(ws))
+        await asyncio.Future()
+
+    async def drain(ws):
+        async for _ in ws:
+            pass
+
+    asyncio.run(main())
+
+
+async def fan_out(server, broadcaster, mode, fast, stalled, broadcasts):
+    packets = [rpost(i) for i in range(broadcasts)]
+    clients = stalled + fast
+    tasks = []
+    start = time.perf_counter()
+    for packet in packets:
+        if mode == "multicast":
+            # What send_packet_multicast does, keeping hold of the sends
+            tasks += [
+                asyncio.create_task(server.execute_unicast(client, packet))
+                for client in clients
+            ]
+        else:
+            broadcaster.publish(clients, packet)
+        # Posts arrive over time, not all in one loop iteration
+        await asyncio.sleep(0)
+
+    # Wait until every reading client has been sent everything
+    if mode == "multicast":
+        await asyncio.gather(
+            *(task for i, task in enumerate(tasks) if i % len(clients) >= len(stalled))
+        )
+    else:
+        while any(client in broadcaster.queues for client in fast):
+            await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    stuck = sum(not task.done() for task in tasks)
+    return elapsed, stuck
+
+
+async def run(mode, port, clients, stalled, broadcasts):
+    server = cloudlink_server()
+    server.logging.disable()
+    broadcaster = Broadcaster(server, max_queue=32)
+    connected = []
+
+    async def handler(ws, path):
+        if len(connected) < stalled:
+            ws.transport.get_extra_info("socket").setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, 1024
+            )
+            ws.transport.set_write_buffer_limits(high=1024)
+        connected.append(ws)
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", port):
+        process = multiprocessing.Process(
+            target=run_clients, args=(port, clients, stalled), daemon=True
+        )
+        process.start()
+        while len(connected) < clients + stalled:
+            await asyncio.sleep(0.05)
+
+        elapsed, stuck = await fan_out(
+            server,
+            broadcaster,
+            mode,
+            connected[stalled:],
+            connected[:stalled],
+            broadcasts,
+        )
+        print(
+            f"  {mode:<12} {clients * broadcasts / elapsed:>9.0f} deliveries/sec"
+            f"  {stuck:>5} sends stuck"
+            f"  {broadcaster.stats['disconnected']:>3} disconnected"
+        )
+        process.kill()
+        for ws in connected:
+            ws.transport.abort()
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    broadcasts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    stalled = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f"{clients} reading clients, {broadcasts} posts")
+    for i, stalled_clients in enumerate((0, stalled)):
+        print(f"{stalled_clients} stalled clients:")
+        for j, mode in enumerate(("multicast", "broadcaster")):
+            port = PORT + 2 * i + j
+            asyncio.run(run(mode, port, clients, stalled_clients, broadcasts))
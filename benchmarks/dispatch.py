@@ -0,0 +1,91 @@
+# Benchmark the per-message cost of routing direct commands
+# Compares the old nested match, which indexes the raw message and wraps
+# every field in str() wherever it is used, with CommandRouter parsing the
+# payload once, checking every field's type. Handlers do nothing else, so
+# this is only the cost of getting from the message to the fields.
+# Usage: python benchmarks/dispatch.py [messages]
+
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from commands import (  # noqa: E402
+    CommandRouter,
+    Credentials,
+    PostDelete,
+    PostEdit,
+    PostSend,
+    RetrieveLatest,
+)
+
+MESSAGES = [
+    {"cmd": "post", "val": {"type": "send", "p": "Hello, world!", "attachment": ""}},
+    {"cmd": "post", "val": {"type": "edit", "uid": "123456789", "edit": "Updated"}},
+    {"cmd": "post", "val": {"type": "delete", "uid": "123456789"}},
+    {"cmd": "retrieve", "val": {"type": "latest", "c": "home", "o": 0}},
+    {"cmd": "auth", "val": {"pswd": "password123"}},
+]
+
+
+async def run_match(messages):
+    start = time.perf_counter()
+    for message in messages:
+        # The field accesses the old handlers made, as they made them
+        match str(message["cmd"]):
+            case "post":
+                match str(message["val"]["type"]):
+                    case "send":
+                        try:
+                            str(message["val"]["attachment"])
+                        except KeyError:
+                            pass
+                        for _ in range(5):
+                            str(message["val"]["p"])
+                    case "delete":
+                        for _ in range(4):
+                            str(message["val"]["uid"])
+                    case "edit":
+                        for _ in range(4):
+                            str(message["val"]["uid"])
+                            str(message["val"]["edit"])
+            case "retrieve":
+                match str(message["val"]["type"]):
+                    case "latest":
+                        message["val"]["c"]
+                        int(message["val"]["o"])
+                        message["val"].get("b")
+            case "auth":
+                message["val"]["pswd"]
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def run_router(messages):
+    router = CommandRouter()
+
+    async def handler(client, payload):
+        # Reading the typed attributes afterwards costs next to nothing
+        pass
+
+    router.command("post", PostSend, type="send")(handler)
+    router.command("post", PostDelete, type="delete")(handler)
+    router.command("post", PostEdit, type="edit")(handler)
+    router.command("retrieve", RetrieveLatest, type="latest")(handler)
+    router.command("auth", Credentials)(handler)
+
+    start = time.perf_counter()
+    for message in messages:
+        await router.dispatch(None, message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    messages = [MESSAGES[i % len(MESSAGES)] for i in range(count)]
+    print(f"{count} messages")
+    print(f"nested match:  {asyncio.run(run_match(messages)):>10.0f} messages/sec")
+    print(f"CommandRouter: {asyncio.run(run_router(messages)):>10.0f} messages/sec")
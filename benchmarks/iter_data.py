@@ -0,0 +1,86 @@
+# Benchmark exporting a large table with select_data and iter_data
+# Reports the time and the peak memory allocated while reading every post.
+# Usage: python benchmarks/iter_data.py [posts] [batch size]
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+# Run from the repository root so db.json and the modules can be found
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceandb import AsyncOceanDB  # noqa: E402
+
+
+def measure(name, export):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count, checksum = export()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{name:<24} {count} rows in {elapsed:>6.2f} s"
+        f"  peak {peak / 1024 / 1024:>8.1f} MiB"
+    )
+    return count, checksum
+
+
+def export_all(rows):
+    count = checksum = 0
+    for row in rows:
+        count += 1
+        checksum += len(row[3])
+    return count, checksum
+
+
+async def export_async(db, batch_size):
+    count = checksum = 0
+    async for row in db.iter_data("posts", batch_size=batch_size):
+        count += 1
+        checksum += len(row[3])
+    return count, checksum
+
+
+if __name__ == "__main__":
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncOceanDB(os.path.join(tmp, "bench"), batch_size=10000)
+        for i in range(posts):
+            db.writer.insert_data(
+                "posts",
+                (
+                    "bench",
+                    time.time(),
+                    str(uuid.uuid4()),
+                    f"Post number {i} " * 10,
+                    False,
+                    "home",
+                    "send",
+                    "",
+                    "NULL",
+                ),
+            )
+        db.writer.flush()
+
+        results = [
+            measure("select_data", lambda: export_all(db.writer.select_data("posts"))),
+            measure(
+                "iter_data",
+                lambda: export_all(db.writer.iter_data("posts", batch_size=batch_size)),
+            ),
+            measure(
+                "AsyncOceanDB.iter_data",
+                lambda: asyncio.run(export_async(db, batch_size)),
+            ),
+        ]
+        assert len(set(results)) == 1, results
+        db.close()
@@ -0,0 +1,291 @@
+# Load test main.py with simulated cloudlink clients
+# Boots the server on a temporary SQLite database, connects the clients,
+# creates and logs into an account for each, then has every client run a
+# seeded random mix of commands and reports throughput and latency
+# percentiles per command. The same seed and options replay the same
+# run; --save writes the generated scenario to a file and --load replays
+# it exactly. Needs the websockets version cloudlink runs on (<11).
+# Usage: python benchmarks/loadtest.py [--clients 1000] [--actions 20]
+#        [--mix post=40,retrieve=35,edit=10,delete=10,auth=5] [--seed 0]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings the server runs with, so the clients measure the server
+# rather than the limits meant for real users
+SETTINGS = {
+    "bridge_enabled": False,
+    "mlModeration": False,
+    "ratelimit_client": [1000, 1],
+    "ratelimit_user": [1000, 1],
+    "ratelimit_ip": [1000000, 1],
+    "password_rounds": 4,
+    "password_max_pending": 100000,
+    "broadcast_max_queue": 100000,
+    "metrics_enabled": False,
+}
+
+WORDS = "hello splash world post chat today nice cool thanks what about this".split()
+
+
+def make_scenario(clients, actions, mix, seed, room_size):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    return {
+        "seed": seed,
+        "room_size": room_size,
+        "clients": [
+            {
+                "username": f"load{seed}_{i}",
+                "room": f"room{i // room_size}",
+                "actions": [
+                    [action, " ".join(rng.choices(WORDS, k=rng.randint(2, 12)))]
+                    for action in rng.choices(names, weights, k=actions)
+                ],
+            }
+            for i in range(clients)
+        ],
+    }
+
+
+class Client:
+    def __init__(self, ws, username, room, latencies, errors):
+        self.ws = ws
+        self.username = username
+        self.room = room
+        self.latencies = latencies
+        self.errors = errors
+        self.posts = []
+
+    async def direct(self, cmd, val):
+        await self.ws.send(
+            json.dumps({"cmd": "direct", "val": {"cmd": cmd, "val": val}})
+        )
+
+    async def expect(self, name, matches, timeout=30):
+        """Wait for the reply that matches, timing it under name."""
+        start = time.perf_counter()
+        deadline = start + timeout
+        while True:
+            try:
+                raw = await asyncio.wait_for(
+                    self.ws.recv(), deadline - time.perf_counter()
+                )
+            except asyncio.TimeoutError:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                return None
+            packet = json.loads(raw)
+            val = packet.get("val")
+            if not isinstance(val, dict):
+                continue
+            if val.get("cmd") == "status" and packet["cmd"] in (
+                "pmsg",
+                "gmsg",
+                "direct",
+            ):
+                key = f"{name}: {val['val'].get('message')}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+                return None
+            if matches(packet["cmd"], val.get("cmd"), val.get("val")):
+                self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+                return val.get("val")
+
+    async def setup(self):
+        await self.ws.send(json.dumps({"cmd": "handshake"}))
+        await self.ws.send(json.dumps({"cmd": "setid", "val": self.username}))
+        while True:
+            packet = json.loads(await self.ws.recv())
+            if packet.get("cmd") == "statuscode" and isinstance(
+                packet.get("val"), dict
+            ):
+                break
+        await self.direct("genaccount", {"pswd": "loadtest"})
+        await self.expect("genaccount", lambda cmd, sub, val: sub == "createdaccount")
+        await self.auth()
+        await self.direct("subscribe", {"c": self.room})
+        await self.expect("subscribe", lambda cmd, sub, val: sub == "rooms")
+        # Stay out of home so fan-out is per room, as in real chats
+        await self.direct("unsubscribe", {"c": "home"})
+        await self.expect("unsubscribe", lambda cmd, sub, val: sub == "rooms")
+
+    async def auth(self):
+        await self.direct("auth", {"pswd": "loadtest"})
+        await self.expect("auth", lambda cmd, sub, val: sub == "auth")
+
+    async def run(self, actions):
+        for action, text in actions:
+            if action in ("edit", "delete") and not self.posts:
+                action = "post"
+            if action == "post":
+                await self.direct("post", {"type": "send", "p": text, "c": self.room})
+                val = await self.expect(
+                    "post",
+                    lambda cmd, sub, val: (
+                        sub == "rpost"
+                        and val["author"] == self.username
+                        and val["post_content"] == text
+                    ),
+                )
+                if val is not None:
+                    self.posts.append(val["uid"])
+            elif action == "edit":
+                uid = self.posts[-1]
+                await self.direct("post", {"type": "edit", "uid": uid, "edit": text})
+                await self.expect(
+                    "edit", lambda cmd, sub, val: sub == "redit" and val["uid"] == uid
+                )
+            elif action == "delete":
+                uid = self.posts.pop()
+                await self.direct("post", {"type": "delete", "uid": uid})
+                await self.expect(
+                    "delete", lambda cmd, sub, val: sub == "rdel" and val["uid"] == uid
+                )
+            elif action == "retrieve":
+                await self.direct(
+                    "retrieve", {"type": "latest", "c": self.room, "o": 0}
+                )
+                await self.expect("retrieve", lambda cmd, sub, val: sub == "posts")
+            elif action == "auth":
+                await self.auth()
+
+
+def boot_server(port, directory):
+    shutil.copy(os.path.join(ROOT, "db.json"), directory)
+    env = dict(os.environ, SPLASH_SETTINGS=json.dumps(dict(SETTINGS, port=port)))
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")],
+        cwd=directory,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=open(os.path.join(directory, "server.log"), "w"),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited, see {directory}/server.log")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The server did not start listening")
+
+
+def report(title, latencies, errors, elapsed):
+    print(f"{title} ({elapsed:.1f} s)")
+    for name in sorted(latencies):
+        samples = [latency * 1000 for latency in latencies[name]]
+        quantiles = (
+            statistics.quantiles(samples, n=100, method="inclusive")
+            if len(samples) > 1
+            else samples * 99
+        )
+        print(
+            f"  {name:<12} {len(samples):>7} ok {len(samples) / elapsed:>9.1f}/s"
+            f"  p50 {quantiles[49]:>8.2f} ms  p95 {quantiles[94]:>8.2f} ms"
+            f"  p99 {quantiles[98]:>8.2f} ms"
+        )
+    for name, count in sorted(errors.items()):
+        print(f"  error: {name} x{count}")
+
+
+async def main(args, scenario):
+    url = f"ws://127.0.0.1:{args.port}"
+    latencies, errors = {}, {}
+    connecting = asyncio.Semaphore(100)
+
+    async def connect(spec):
+        async with connecting:
+            ws = await websockets.connect(url, max_queue=None, open_timeout=60)
+            client = Client(ws, spec["username"], spec["room"], latencies, errors)
+            await client.setup()
+            return client
+
+    start = time.perf_counter()
+    clients = await asyncio.gather(*(connect(spec) for spec in scenario["clients"]))
+    report(
+        f"{len(clients)} clients connected and logged in",
+        latencies,
+        errors,
+        time.perf_counter() - start,
+    )
+
+    latencies.clear()
+    errors.clear()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client.run(spec["actions"])
+            for client, spec in zip(clients, scenario["clients"])
+        )
+    )
+    elapsed = time.perf_counter() - start
+    total = sum(len(samples) for samples in latencies.values())
+    report(
+        f"Command mix: {total / elapsed:.0f} commands/sec", latencies, errors, elapsed
+    )
+
+    for client in clients:
+        await client.ws.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Splash server")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--actions", type=int, default=20, help="commands per client")
+    parser.add_argument("--mix", default="post=40,retrieve=35,edit=10,delete=10,auth=5")
+    parser.add_argument("--room-size", type=int, default=20, help="clients per chat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--save", help="write the generated scenario to this file")
+    parser.add_argument("--load", help="replay a scenario written by --save")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the temporary directory"
+    )
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load) as f:
+            scenario = json.load(f)
+    else:
+        mix = {
+            name: float(weight)
+            for name, weight in (part.split("=") for part in args.mix.split(","))
+        }
+        scenario = make_scenario(
+            args.clients, args.actions, mix, args.seed, args.room_size
+        )
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(scenario, f)
+
+    directory = tempfile.mkdtemp(prefix="splash-loadtest-")
+    server = boot_server(args.port, directory)
+    try:
+        asyncio.run(main(args, scenario))
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        if args.keep:
+            print(f"Server files kept in {directory}")
+        else:
+            shutil.rmtree(directory)
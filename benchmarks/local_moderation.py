@@ -0,0 +1,47 @@
+# Benchmark the local moderation model
+# Trains a throwaway model on synthetic posts, then scores texts one at a
+# time (as Moderator does) and in batches.
+# Usage: python benchmarks/local_moderation.py [texts]
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from localmoderation import LocalToxicityModel  # noqa: E402
+
+CLEAN = "the quick brown fox jumps over a lazy dog hello world nice day".split()
+TOXIC = "idiot stupid loser trash moron dumb".split()
+
+
+def make_post(toxic, words=30):
+    post = [random.choice(CLEAN) for _ in range(words)]
+    if toxic:
+        post[random.randrange(words)] = random.choice(TOXIC)
+    return " ".join(post)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(0)
+    labels = [i % 2 for i in range(2000)]
+    model = LocalToxicityModel.train([make_post(y) for y in labels], labels)
+    texts = [make_post(i % 2) for i in range(count)]
+
+    start = time.perf_counter()
+    for text in texts:
+        model.score(text)
+    single = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, count, 64):
+        model.score_batch(texts[i : i + 64])
+    batched = count / (time.perf_counter() - start)
+
+    print(f"{count} posts of 30 words")
+    print(f"one at a time: {single:>10.0f} texts/sec")
+    print(f"batches of 64: {batched:>10.0f} texts/sec")
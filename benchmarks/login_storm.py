@@ -0,0 +1,84 @@
+# Benchmark event loop latency while many clients log in at once
+# Compares bcrypt on the event loop with PasswordHasher's worker pool.
+# Usage: python benchmarks/login_storm.py [logins] [rounds]
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import bcrypt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from passwords import PasswordHasher, PasswordHasherBusy  # noqa: E402
+
+# How often the probe task wants to run, like a client's message would
+TICK = 0.001
+
+
+async def probe(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - expected)
+
+
+async def storm(check, logins):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(check() for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    rejected = sum(isinstance(result, PasswordHasherBusy) for result in results)
+    return lags, elapsed, rejected
+
+
+def report(name, result):
+    lags, elapsed, rejected = result
+    quantiles = statistics.quantiles(
+        [lag * 1000 for lag in lags], n=100, method="inclusive"
+    )
+    print(
+        f"{name:<22} p50 {quantiles[49]:>8.2f} ms  p95 {quantiles[94]:>8.2f} ms"
+        f"  p99 {quantiles[98]:>8.2f} ms  max {max(lags) * 1000:>8.2f} ms"
+        f"  {elapsed:>6.2f} s total, {rejected} rejected"
+    )
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    password = b"correct horse battery staple"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    print(f"{logins} simultaneous logins, bcrypt cost {rounds}")
+
+    async def inline():
+        return bcrypt.checkpw(password, hashed)
+
+    report("on the event loop", asyncio.run(storm(inline, logins)))
+
+    for workers in (1, 2, 4):
+        hasher = PasswordHasher(workers=workers, max_pending=logins)
+        result = asyncio.run(
+            storm(lambda: hasher.check(password.decode(), hashed), logins)
+        )
+        report(f"pool, {workers} workers", result)
+        hasher.close()
+
+    hasher = PasswordHasher(workers=2, max_pending=8)
+    result = asyncio.run(storm(lambda: hasher.check(password.decode(), hashed), logins))
+    report("pool, 8 pending max", result)
+    hasher.close()
@@ -0,0 +1,47 @@
+# Benchmark the cost metrics add to a handled command
+# Times a stage with `with metrics.time()` and calls an instrumented
+# coroutine, with metrics enabled and disabled, against the bare calls.
+# Usage: python benchmarks/metrics_overhead.py [calls]
+
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from metrics import Metrics  # noqa: E402
+
+
+class Stage:
+    async def run(self):
+        pass
+
+
+async def measure(metrics, calls):
+    stage = Stage()
+    if metrics is not None:
+        metrics.instrument(stage, "stage", "run")
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        if metrics is None:
+            await stage.run()
+        else:
+            with metrics.time("command", "post"):
+                await stage.run()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    bare = asyncio.run(measure(None, calls))
+    print(f"no metrics:        {bare:>7.0f} ns/call")
+    for enabled in (False, True):
+        cost = asyncio.run(measure(Metrics(enabled), calls))
+        print(
+            f"metrics {'enabled: ' if enabled else 'disabled:'} {cost:>7.0f} ns/call"
+            f" (+{cost - bare:.0f} ns)"
+        )
@@ -0,0 +1,48 @@
+# Benchmark profanity censoring of long posts
+# Compares the old reload-per-call moderation, better_profanity with the
+# word list loaded once, and the compiled ProfanityFilter.
+# Usage: python benchmarks/moderation.py [posts]
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from better_profanity import Profanity, profanity  # noqa: E402
+
+from profanityfilter import ProfanityFilter  # noqa: E402
+
+WORDS = "the quick brown fox jumps over a lazy dog while sh1t happens today".split()
+
+
+def make_post(words):
+    return " ".join(random.choice(WORDS) for _ in range(words)) + "."
+
+
+def run(name, censor, posts):
+    start = time.perf_counter()
+    results = [censor(post) for post in posts]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(posts) / elapsed:>10.1f} posts/sec")
+    return results
+
+
+def reload_and_censor(text):
+    profanity.load_censor_words()
+    return profanity.censor(text)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    random.seed(0)
+    posts = [make_post(300) for _ in range(count)]
+    print(f"{count} posts of 300 words")
+
+    old = run("reload every call (old)", reload_and_censor, posts)
+    cached = run("better_profanity, cached", Profanity().censor, posts)
+    fast = run("ProfanityFilter", ProfanityFilter().censor, posts)
+    assert old == cached == fast
@@ -0,0 +1,46 @@
+# Benchmark OceanDB post inserts with and without group commits
+# Usage: python benchmarks/oceandb_writes.py [posts]
+
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+# Run from the repository root so db.json and the modules can be found
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceandb import OceanDB  # noqa: E402
+
+
+def run(posts, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = OceanDB(os.path.join(tmp, "bench"), batch_size=batch_size)
+        start = time.perf_counter()
+        for i in range(posts):
+            db.insert_data(
+                "posts",
+                (
+                    "bench",
+                    float(time.time()),
+                    str(uuid.uuid4()),
+                    f"Post number {i}",
+                    False,
+                    "home",
+                    "send",
+                    "",
+                    "NULL",
+                ),
+            )
+        db.close()
+        return posts / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results = [(size, run(posts, size)) for size in (1, 16, 64, 256)]
+    print()
+    for size, rate in results:
+        print(f"batch_size={size:<4} {rate:>10.0f} posts/sec")
@@ -0,0 +1,86 @@
+# Benchmark rate limiter memory while clients connect and disconnect
+# Compares the old dict-per-client limiter that never forgets a client with
+# WebSocketRateLimiter, with and without removal on disconnect.
+# Usage: python benchmarks/ratelimiter_memory.py [clients]
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from utils import WebSocketRateLimiter  # noqa: E402
+
+# Messages sent by every client before it disconnects
+MESSAGES = 3
+
+
+class OldRateLimiter:
+    def __init__(self, rate_limit, time_interval):
+        self.rate_limit = rate_limit
+        self.time_interval = time_interval
+        self.client_buckets = {}
+
+    async def acquire(self, client_id):
+        current_time = time.time()
+        if client_id not in self.client_buckets:
+            self.client_buckets[client_id] = {
+                "tokens": self.rate_limit,
+                "last_update": current_time,
+            }
+        client_bucket = self.client_buckets[client_id]
+        elapsed_time = current_time - client_bucket["last_update"]
+        client_bucket["tokens"] = min(
+            client_bucket["tokens"]
+            + elapsed_time * (self.rate_limit / self.time_interval),
+            self.rate_limit,
+        )
+        client_bucket["last_update"] = current_time
+        if client_bucket["tokens"] >= 1:
+            client_bucket["tokens"] -= 1
+            return True
+        return False
+
+
+async def churn(limiter, client_ids, disconnect):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for client_id in client_ids:
+        for _ in range(MESSAGES):
+            await limiter.acquire(client_id)
+        if disconnect:
+            limiter.remove(client_id)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rate = len(client_ids) * MESSAGES / elapsed
+    return current, peak, rate
+
+
+def report(name, result):
+    current, peak, rate = result
+    print(
+        f"{name:<26} {current / 1024:>9.0f} KiB retained"
+        f" {peak / 1024:>9.0f} KiB peak {rate:>10.0f} acquires/sec"
+    )
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    client_ids = [uuid.uuid4() for _ in range(clients)]
+    print(f"{clients} clients connecting and disconnecting")
+    report("old limiter", asyncio.run(churn(OldRateLimiter(5, 1), client_ids, False)))
+    # A tiny interval so the periodic sweep can catch idle buckets in one run
+    report(
+        "sweep only",
+        asyncio.run(churn(WebSocketRateLimiter(5, 0.001), client_ids, False)),
+    )
+    report(
+        "remove on disconnect",
+        asyncio.run(churn(WebSocketRateLimiter(5, 1), client_ids, True)),
+    )
@@ -0,0 +1,80 @@
+# Benchmark the ownership lookup of post edits and deletes
+# Compares loading whole post rows with selecting only the columns the
+# check needs, as plain tuples and as named rows, and with exists().
+# Usage: python benchmarks/select_projection.py [lookups] [posts] [post size]
+
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+# Run from the repository root so db.json and the modules can be found
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceandb import OceanDB  # noqa: E402
+
+
+def run(name, lookup, uids, lookups):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        lookup(rng.choice(uids))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<22} {lookups / elapsed:>9.0f} lookups/s"
+        f"  {elapsed / lookups * 1e6:>7.1f} us per lookup"
+    )
+
+
+if __name__ == "__main__":
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    posts = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    size = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = OceanDB(os.path.join(tmp, "bench"), batch_size=1000)
+        uids = []
+        for i in range(posts):
+            uid = str(uuid.uuid4())
+            uids.append(uid)
+            db.insert_data(
+                "posts",
+                (
+                    "bench",
+                    time.time(),
+                    uid,
+                    "x" * size,
+                    False,
+                    "home",
+                    "send",
+                    "",
+                    "NULL",
+                ),
+            )
+        db.flush()
+
+        def select_all(uid):
+            selection = db.select_data("posts", {"uid": uid})
+            return selection[0][0], selection[0][5]
+
+        def select_columns(uid):
+            selection = db.select_data(
+                "posts", {"uid": uid}, ["author", "post_origin"], limit=1
+            )
+            return selection[0][0], selection[0][1]
+
+        def select_rows(uid):
+            selection = db.select_data(
+                "posts", {"uid": uid}, ["author", "post_origin"], limit=1, as_rows=True
+            )
+            return selection[0].author, selection[0].post_origin
+
+        run("SELECT *", select_all, uids, lookups)
+        run("columns", select_columns, uids, lookups)
+        run("columns as rows", select_rows, uids, lookups)
+        run("exists()", lambda uid: db.exists("posts", {"uid": uid}), uids, lookups)
+        db.close()
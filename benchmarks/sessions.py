@@ -0,0 +1,55 @@
+# Benchmark username lookups for authenticated clients
+# Compares the old parallel lists with SessionRegistry.
+# Usage: python benchmarks/sessions.py [clients]
+
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from utils import SessionRegistry  # noqa: E402
+
+# Lookups per simulated message, as done by the old post handlers
+LOOKUPS = 4
+
+
+def run_lists(client_ids, messages):
+    authenticated_clients = []
+    authenticated_client_usernames = []
+    for i, client_id in enumerate(client_ids):
+        authenticated_clients.append(client_id)
+        authenticated_client_usernames.append(f"user{i}")
+
+    start = time.perf_counter()
+    for client_id in messages:
+        if client_id in authenticated_clients:
+            for _ in range(LOOKUPS):
+                authenticated_client_usernames[authenticated_clients.index(client_id)]
+    return len(messages) / (time.perf_counter() - start)
+
+
+def run_registry(client_ids, messages):
+    sessions = SessionRegistry()
+    for i, client_id in enumerate(client_ids):
+        sessions.add(client_id, f"user{i}")
+
+    start = time.perf_counter()
+    for client_id in messages:
+        if client_id in sessions:
+            for _ in range(LOOKUPS):
+                sessions[client_id]
+    return len(messages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    client_ids = [uuid.uuid4() for _ in range(clients)]
+    messages = [random.choice(client_ids) for _ in range(20000)]
+    print(f"{clients} connected clients")
+    print(f"lists:           {run_lists(client_ids, messages):>12.0f} messages/sec")
+    print(f"SessionRegistry: {run_registry(client_ids, messages):>12.0f} messages/sec")
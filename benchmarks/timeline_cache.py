@@ -0,0 +1,102 @@
+# Benchmark retrieve latest reads with and without the timeline cache
+# Fills a few chats with posts, then reads the first pages of random chats
+# while a share of the operations send, edit and delete posts.
+# Usage: python benchmarks/timeline_cache.py [reads] [chats] [posts per chat]
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Run from the repository root so db.json and the modules can be found
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceandb import AsyncOceanDB  # noqa: E402
+from timeline import TimelineCache  # noqa: E402
+
+# Share of operations that write instead of reading
+WRITES = 0.1
+
+
+def post(chat):
+    return (
+        "bench",
+        time.time(),
+        str(uuid.uuid4()),
+        "Hello " * 8,
+        False,
+        chat,
+        "send",
+        "",
+        "NULL",
+    )
+
+
+async def run(db, cache, reads, chats):
+    rng = random.Random(0)
+    latencies = []
+    uids = {chat: [] for chat in chats}
+    start = time.perf_counter()
+    done = 0
+    while done < reads:
+        chat = rng.choice(chats)
+        if rng.random() < WRITES:
+            values = post(chat)
+            await db.insert_data("posts", values)
+            uids[chat].append(values[2])
+            if cache:
+                cache.insert(values)
+            if len(uids[chat]) > 1:
+                uid = uids[chat].pop(0)
+                await db.update_data("posts", {"isDeleted": True}, {"uid": uid})
+                if cache:
+                    cache.remove(chat, uid)
+            continue
+        read_start = time.perf_counter()
+        await (cache or db).select_timeline(chat, rng.choice((0, 0, 0, 20)))
+        latencies.append(time.perf_counter() - read_start)
+        done += 1
+    return latencies, time.perf_counter() - start
+
+
+def report(name, latencies, elapsed):
+    quantiles = statistics.quantiles(
+        [latency * 1e6 for latency in latencies], n=100, method="inclusive"
+    )
+    print(
+        f"{name:<10} {len(latencies) / elapsed:>9.0f} reads/s"
+        f"  p50 {quantiles[49]:>8.1f} us  p99 {quantiles[98]:>8.1f} us"
+    )
+
+
+async def main(reads, chat_count, posts):
+    chats = [f"chat{i}" for i in range(chat_count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncOceanDB(os.path.join(tmp, "bench"), batch_size=64)
+        for chat in chats:
+            for _ in range(posts):
+                await db.insert_data("posts", post(chat))
+        await db.flush()
+
+        report("database", *await run(db, None, reads, chats))
+        cache = TimelineCache(db)
+        report("cached", *await run(db, cache, reads, chats))
+        stats = cache.stats
+        print(
+            f"hit rate {stats['hits'] / (stats['hits'] + stats['misses']):.1%},"
+            f" {cache.bytes / 1024:.0f} KiB cached"
+        )
+        db.close()
+
+
+if __name__ == "__main__":
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    chat_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    posts = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    asyncio.run(main(reads, chat_count, posts))
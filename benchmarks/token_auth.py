@@ -0,0 +1,42 @@
+# Benchmark logging back in with a session token instead of a password
+# Usage: python benchmarks/token_auth.py [logins] [rounds]
+
+import os
+import sys
+import time
+
+import bcrypt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sessiontokens import SessionTokens  # noqa: E402
+
+
+def report(name, logins, elapsed):
+    print(
+        f"{name:<16} {logins / elapsed:>10.0f} logins/s"
+        f"  {elapsed / logins * 1e6:>10.1f} us per login"
+    )
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    hashed = bcrypt.hashpw(b"password", bcrypt.gensalt(rounds))
+    checks = max(logins // 1000, 5)
+    start = time.perf_counter()
+    for _ in range(checks):
+        bcrypt.checkpw(b"password", hashed)
+    report(f"bcrypt ({rounds} rounds)", checks, time.perf_counter() - start)
+
+    tokens = SessionTokens("benchmark key " * 4)
+    # Revocations of other sessions, which every check looks up
+    for i in range(10000):
+        tokens.revoked[f"{i:032x}"] = time.time() + 3600
+    token = tokens.issue("someone")
+    start = time.perf_counter()
+    for _ in range(logins):
+        tokens.verify(token)
+    report("session token", logins, time.perf_counter() - start)
@@ -0,0 +1,88 @@
+# Benchmark user lookups during a login and enumeration storm
+# Half the lookups retry a few real usernames, half probe made-up ones
+# drawn from a limited pool, with and without the user cache.
+# Usage: python benchmarks/user_cache.py [lookups] [users]
+
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Run from the repository root so db.json and the modules can be found
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from oceandb import AsyncOceanDB  # noqa: E402
+from users import UserCache  # noqa: E402
+
+
+async def run(lookup, lookups, users):
+    rng = random.Random(0)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(lookups):
+        if rng.random() < 0.5:
+            username = f"user{rng.randrange(users)}"
+        else:
+            username = f"probe{rng.randrange(2000)}"
+        lookup_start = time.perf_counter()
+        await lookup(username)
+        latencies.append(time.perf_counter() - lookup_start)
+    return latencies, time.perf_counter() - start
+
+
+def report(name, latencies, elapsed):
+    quantiles = statistics.quantiles(
+        [latency * 1e6 for latency in latencies], n=100, method="inclusive"
+    )
+    print(
+        f"{name:<10} {len(latencies) / elapsed:>9.0f} lookups/s"
+        f"  p50 {quantiles[49]:>8.1f} us  p99 {quantiles[98]:>8.1f} us"
+    )
+
+
+async def main(lookups, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncOceanDB(os.path.join(tmp, "bench"), batch_size=64)
+        for i in range(users):
+            await db.insert_data(
+                "users",
+                (
+                    f"user{i}",
+                    time.time(),
+                    str(uuid.uuid4()),
+                    False,
+                    "",
+                    1,
+                    time.time(),
+                    json.dumps([]),
+                    json.dumps([]),
+                    b"$2b$12$" + b"x" * 53,
+                ),
+            )
+        await db.flush()
+
+        report(
+            "database",
+            *await run(
+                lambda username: db.select_data("users", {"username": username}),
+                lookups,
+                users,
+            ),
+        )
+        cache = UserCache(db)
+        report("cached", *await run(cache.get, lookups, users))
+        print(cache.stats)
+        db.close()
+
+
+if __name__ == "__main__":
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    asyncio.run(main(lookups, users))
@@ -0,0 +1,154 @@
+from logs import Info, Warning, Error  # noqa: F401
+import concurrent.futures
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class BridgeDispatcher:
+    """
+    Long-lived worker that forwards posts to the bridge over pooled HTTP.
+
+    Posts are queued without blocking the event loop. A background thread
+    drains up to batch_size of them at a time and sends the batch
+    concurrently over a shared requests.Session, retrying failures with
+    exponential backoff. When the queue is full new posts are dropped and
+    counted instead of slowing the server down.
+
+    Args:
+        url (str): Base URL the post text is appended to.
+        token (str): Bearer token sent with every request.
+        max_queue (int): Maximum number of posts waiting to be sent.
+        batch_size (int): Maximum number of posts sent per flush.
+        workers (int): Number of concurrent requests per flush.
+        retries (int): Number of retries after a failed request.
+        backoff (float): Delay before the first retry, doubled on each retry.
+        timeout (float): Timeout of a single request in seconds.
+
+    Attributes:
+        stats (dict): Counters for queued, sent, failed, retried and dropped posts.
+
+    Methods:
+        submit(text: str) -> bool: Queue a post for the bridge.
+        close(timeout: float = 5): Send what is queued and stop the worker.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: str = None,  # type: ignore
+        max_queue: int = 1000,
+        batch_size: int = 16,
+        workers: int = 4,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 5,
+    ) -> None:
+        self.url = url
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+        self.stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=workers))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+        if token:
+            self.session.headers["Authorization"] = "Bearer " + token
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bridge-sender"
+        )
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="bridge", daemon=True)
+        self.thread.start()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def submit(self, text: str) -> bool:
+        """
+        Queue a post for the bridge without blocking.
+
+        Args:
+            text (str): The text appended to the bridge URL.
+
+        Returns:
+            bool: False if the post was dropped because the queue is full or closed.
+        """
+        if self.closed:
+            self._count("dropped")
+            return False
+        try:
+            self.queue.put_nowait(text)
+        except queue.Full:
+            self._count("dropped")
+            Warning("Bridge queue is full, dropping post")
+            return False
+        self._count("queued")
+        return True
+
+    def _send(self, text: str) -> bool:
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count("retried")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(self.url + text, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+                continue
+            # Client errors other than rate limits won't succeed on retry
+            if response.status_code < 500 and response.status_code != 429:
+                self._count("sent" if response.ok else "failed")
+                return response.ok
+            error = f"HTTP {response.status_code}"
+
+        self._count("failed")
+        Error(f"Bridge request failed after {self.retries + 1} attempts: {error}")
+        return False
+
+    def _run(self) -> None:
+        while True:
+            text = self.queue.get()
+            if text is None:
+                return
+            batch = [text]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    text = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if text is None:
+                    stop = True
+                    break
+                batch.append(text)
+
+            list(self.executor.map(self._send, batch))
+            if stop:
+                return
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        Stop accepting posts, send what is queued and stop the worker.
+
+        Args:
+            timeout (float): Seconds to wait for queued posts to be sent.
+        """
+        self.closed = True
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            Warning("Bridge queue did not drain before shutdown")
+        self.thread.join(timeout)
+        self.executor.shutdown(wait=False)
+        self.session.close()
+        Info(f"Closed bridge: {self.stats}")
@@ -0,0 +1,101 @@
+from logs import Warning  # noqa: F401
+import asyncio
+import collections
+
+
+class Broadcaster:
+    """
+    Sends one packet to many clients, serializing it only once.
+
+    cloudlink's send_packet_multicast dumps the packet to JSON again for
+    every client. publish() dumps it once and hands the same string to a
+    per-client send queue. Each client with queued packets has its own
+    sender task, so all sockets are written concurrently and a slow socket
+    only delays itself. A client whose queue reaches max_queue is too slow
+    to keep up: it is disconnected, or if disconnect_slow is off, misses
+    the packets that don't fit.
+
+    Args:
+        server: The cloudlink server, used for its JSON encoder and to close clients.
+        max_queue (int): Maximum number of packets waiting for one client.
+        disconnect_slow (bool): Disconnect clients whose queue is full.
+
+    Attributes:
+        stats (dict): Counters for published, sent and dropped packets and disconnects.
+
+    Methods:
+        publish(clients: iterable, packet: dict): Send a packet to every client.
+        remove(client): Forget a disconnected client.
+    """
+
+    def __init__(self, server, max_queue: int = 256, disconnect_slow: bool = True):
+        self.server = server
+        self.max_queue = max_queue
+        self.disconnect_slow = disconnect_slow
+        # Client -> packets waiting to be sent, and the task sending them
+        self.queues = {}
+        self.senders = {}
+        # Slow clients that are being disconnected
+        self.closing = set()
+        self.stats = {"published": 0, "sent": 0, "dropped": 0, "disconnected": 0}
+
+    def publish(self, clients, packet) -> None:
+        """
+        Send a packet to every client without waiting for the sockets.
+
+        Args:
+            clients (iterable): The cloudlink clients to send to.
+            packet (dict | str): The packet, or an already serialized one.
+        """
+        data = packet if isinstance(packet, str) else self.server.ujson.dumps(packet)
+        self.stats["published"] += 1
+        for client in list(clients):
+            self._enqueue(client, data)
+
+    def _enqueue(self, client, data: str) -> None:
+        if client in self.closing:
+            self.stats["dropped"] += 1
+            return
+
+        pending = self.queues.get(client)
+        if pending is None:
+            pending = self.queues[client] = collections.deque()
+            self.senders[client] = asyncio.get_running_loop().create_task(
+                self._send(client, pending)
+            )
+        elif len(pending) >= self.max_queue:
+            self._slow(client, pending)
+            return
+        pending.append(data)
+
+    def _slow(self, client, pending: collections.deque) -> None:
+        self.stats["dropped"] += 1
+        if not self.disconnect_slow:
+            return
+        self.stats["dropped"] += len(pending)
+        self.stats["disconnected"] += 1
+        pending.clear()
+        self.closing.add(client)
+        Warning(f"Disconnecting client {client.id}: it can't keep up with broadcasts")
+        self.server.close_connection(client, code=1008, reason="Too slow")
+
+    async def _send(self, client, pending: collections.deque) -> None:
+        try:
+            while pending:
+                await client.send(pending.popleft())
+                self.stats["sent"] += 1
+        except Exception:
+            # The connection is gone, on_disconnect will clean up
+            self.stats["dropped"] += len(pending)
+            pending.clear()
+        finally:
+            if self.queues.get(client) is pending:
+                del self.queues[client]
+                del self.senders[client]
+
+    def remove(self, client) -> None:
+        self.closing.discard(client)
+        self.queues.pop(client, None)
+        sender = self.senders.pop(client, None)
+        if sender is not None:
+            sender.cancel()
@@ -0,0 +1,221 @@
+import dataclasses
+import types
+import typing
+
+
+class PayloadError(ValueError):
+    """Raised when a command's payload is missing a field or has the wrong type."""
+
+
+def _to_str(value):
+    # Numbers are accepted for text fields like uids, as str() used to do
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise TypeError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value)
+    raise TypeError
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise TypeError
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        return float(value)
+    raise TypeError
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    raise TypeError
+
+
+CONVERTERS = {str: _to_str, int: _to_int, float: _to_float, bool: _to_bool}
+
+# Deepest page retrieve can skip to; older posts are reached with "b"
+MAX_OFFSET = 1_000_000
+
+
+def compile_payload(payload):
+    """
+    Turn a payload dataclass into the field checks parse_payload() runs.
+
+    Fields may be str, int, float or bool, optionally `| None`, and are
+    required unless they have a default. Numbers can be limited to a range
+    with metadata={"range": (low, high)}.
+    """
+    hints = typing.get_type_hints(payload)
+    fields = []
+    for field in dataclasses.fields(payload):
+        annotation = hints[field.name]
+        nullable = False
+        if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+            args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+            nullable = len(args) < len(typing.get_args(annotation))
+            annotation = args[0]
+        bounds = field.metadata.get("range")
+        fields.append(
+            (
+                field.name,
+                # Values with a range always take the checked path
+                annotation if bounds is None else None,
+                annotation,
+                CONVERTERS[annotation],
+                nullable,
+                field.default,
+                bounds,
+            )
+        )
+    return fields
+
+
+def parse_payload(payload, fields, data):
+    """Check and convert a message's fields and build its payload object."""
+    if data.__class__ is not dict:
+        raise PayloadError("expected an object")
+    values = []
+    for name, exact, kind, convert, nullable, default, bounds in fields:
+        value = data.get(name, dataclasses.MISSING)
+        # Values of exactly the right type, the usual case, need no checks
+        if value.__class__ is not exact:
+            if value is dataclasses.MISSING:
+                if default is dataclasses.MISSING:
+                    raise PayloadError(f"missing {name}")
+                value = default
+            elif value is not None or not nullable:
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError):
+                    raise PayloadError(
+                        f"{name} must be of type {kind.__name__}"
+                    ) from None
+                if bounds is not None and not bounds[0] <= value <= bounds[1]:
+                    raise PayloadError(
+                        f"{name} must be between {bounds[0]} and {bounds[1]}"
+                    )
+        values.append(value)
+    return payload(*values)
+
+
+class CommandRouter:
+    """
+    Dispatch table for the sub-commands of the direct command.
+
+    Handlers are registered per command, and per payload type for commands
+    like post whose payload carries one. Each handler declares a payload
+    dataclass; the message is checked and converted into it once, before
+    the handler runs, so handlers read typed attributes instead of indexing
+    the raw message.
+
+    Methods:
+        command(cmd: str, payload: type, type: str = None): Register a handler.
+        dispatch(client, message: dict) -> bool: Run the matching handler.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        # Names of the registered commands
+        self.names = set()
+
+    def command(self, cmd, payload, type=None):
+        """
+        Register an async handler(client, payload) for a command.
+
+        Args:
+            cmd (str): The command, e.g. "post".
+            payload (type): The payload dataclass.
+            type (str): The payload's "type" field, for commands that have one.
+        """
+
+        def register(handler):
+            self.handlers[(cmd, type)] = (handler, payload, compile_payload(payload))
+            self.names.add(cmd)
+            return handler
+
+        return register
+
+    async def dispatch(self, client, message):
+        """
+        Run the handler registered for a message.
+
+        Returns:
+            bool: False if no handler matches the message.
+
+        Raises:
+            PayloadError: If the message's payload doesn't fit the handler.
+        """
+        if not isinstance(message, dict):
+            return False
+        cmd = message.get("cmd")
+        data = message.get("val")
+        if not isinstance(cmd, str):
+            return False
+
+        entry = self.handlers.get((cmd, None))
+        if entry is None and isinstance(data, dict):
+            payload_type = data.get("type")
+            if isinstance(payload_type, str):
+                entry = self.handlers.get((cmd, payload_type))
+        if entry is None:
+            return False
+
+        handler, payload, fields = entry
+        await handler(client, parse_payload(payload, fields, data))
+        return True
+
+
+# Payloads of the direct sub-commands
+
+
+@dataclasses.dataclass(slots=True)
+class PostSend:
+    p: str
+    attachment: str = ""
+    c: str = "home"
+
+
+@dataclasses.dataclass(slots=True)
+class PostDelete:
+    uid: str
+
+
+@dataclasses.dataclass(slots=True)
+class PostEdit:
+    uid: str
+    edit: str
+
+
+@dataclasses.dataclass(slots=True)
+class Credentials:
+    pswd: str
+
+
+@dataclasses.dataclass(slots=True)
+class RetrieveLatest:
+    c: str
+    o: int = dataclasses.field(default=0, metadata={"range": (0, MAX_OFFSET)})
+    b: float | None = None
+
+
+@dataclasses.dataclass(slots=True)
+class Room:
+    c: str
+
+
+@dataclasses.dataclass(slots=True)
+class SessionToken:
+    token: str
@@ -0,0 +1,145 @@
+import argparse
+import csv
+
+import numpy as np
+
+# Multiplier of the rolling n-gram hash (a large odd 32-bit constant)
+HASH_PRIME = np.uint64(2654435761)
+HASH_MASK = np.uint64(0xFFFFFFFF)
+
+
+class LocalToxicityModel:
+    """
+    Offline toxicity classifier: a linear model over hashed byte n-grams.
+
+    The lowercased text is turned into byte n-grams, which are hashed into
+    a fixed number of buckets with NumPy. The toxicity score is the sigmoid
+    of the bucket weights summed over all n-grams, scaled by the root of
+    their count, plus a bias. The model file is a NumPy .npz archive
+    written by save() or by `python localmoderation.py data.csv model.npz`.
+
+    Args:
+        weights (np.ndarray): One weight per hash bucket.
+        bias (float): The model's bias.
+        ngram_min (int): Shortest byte n-gram.
+        ngram_max (int): Longest byte n-gram.
+
+    Methods:
+        load(path: str) -> LocalToxicityModel: Load a model file.
+        save(path: str): Write the model file.
+        score(text: str) -> float: Toxicity score of a text, between 0 and 1.
+        score_batch(texts: list) -> np.ndarray: Toxicity scores of several texts.
+        train(texts: list, labels: list) -> LocalToxicityModel: Fit a model.
+    """
+
+    def __init__(self, weights, bias=0.0, ngram_min=2, ngram_max=4):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.ngram_min = ngram_min
+        self.ngram_max = ngram_max
+        self.mask = np.uint64(len(self.weights) - 1)
+        if len(self.weights) & (len(self.weights) - 1):
+            raise ValueError("The number of hash buckets must be a power of two")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["weights"],
+                data["bias"],
+                int(data["ngram_min"]),
+                int(data["ngram_max"]),
+            )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            ngram_min=self.ngram_min,
+            ngram_max=self.ngram_max,
+        )
+
+    def features(self, text):
+        """Return the hash bucket of every byte n-gram of the text."""
+        # Pad with spaces so words at the edges get their own n-grams
+        data = np.frombuffer(f" {text.lower()} ".encode("utf-8"), dtype=np.uint8)
+        data = data.astype(np.uint64)
+        buckets = []
+        for n in range(self.ngram_min, self.ngram_max + 1):
+            if len(data) < n:
+                break
+            count = len(data) - n + 1
+            hashes = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = (
+                    hashes * HASH_PRIME + data[offset : offset + count]
+                ) & HASH_MASK
+            buckets.append(hashes & self.mask)
+        if not buckets:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(buckets).astype(np.int64)
+
+    def score(self, text):
+        return float(self.score_batch([text])[0])
+
+    def score_batch(self, texts):
+        features = [self.features(text) for text in texts]
+        lengths = np.array([len(f) for f in features])
+        totals = np.zeros(len(texts), dtype=np.float64)
+        if lengths.sum():
+            weights = self.weights[np.concatenate(features)]
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            nonempty = lengths > 0
+            totals[nonempty] = np.add.reduceat(weights, starts[nonempty])
+        # Scale by the root of the n-gram count so long texts don't dominate
+        logits = totals / np.sqrt(np.maximum(lengths, 1)) + self.bias
+        return 1 / (1 + np.exp(-logits))
+
+    @classmethod
+    def train(
+        cls,
+        texts,
+        labels,
+        buckets=2**18,
+        ngram_min=2,
+        ngram_max=4,
+        epochs=5,
+        learning_rate=0.1,
+        seed=0,
+    ):
+        """Fit a logistic regression with SGD. Labels are 1 for toxic texts."""
+        model = cls(np.zeros(buckets, dtype=np.float32), 0.0, ngram_min, ngram_max)
+        features = [model.features(text) for text in texts]
+        labels = np.asarray(labels, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            for i in rng.permutation(len(texts)):
+                if not len(features[i]):
+                    continue
+                scale = 1 / np.sqrt(len(features[i]))
+                logit = model.weights[features[i]].sum() * scale + model.bias
+                error = 1 / (1 + np.exp(-logit)) - labels[i]
+                np.add.at(model.weights, features[i], -learning_rate * error * scale)
+                model.bias -= learning_rate * error
+        return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local moderation model")
+    parser.add_argument("data", help="CSV file with text,label rows (1 = toxic)")
+    parser.add_argument("model", help="where to write the .npz model")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--buckets", type=int, default=2**18)
+    args = parser.parse_args()
+
+    with open(args.data, newline="", encoding="utf-8") as f:
+        rows = [row for row in csv.reader(f) if len(row) >= 2]
+    model = LocalToxicityModel.train(
+        [row[0] for row in rows],
+        [int(row[1]) for row in rows],
+        buckets=args.buckets,
+        epochs=args.epochs,
+    )
+    model.save(args.model)
+    print(f"Trained on {len(rows)} texts, saved to {args.model}")
@@ -13,19 +13,17 @@ import uuid
 
 # Import cryptography
 import bcrypt  # noqa: F401
+from passwords import PasswordHasher, PasswordHasherBusy
 
 # Import JSON Web token handler
 import jwt  # noqa: F401
+from sessiontokens import SessionTokens, InvalidSessionToken
 
-# Import paralelized tasks helper
-import concurrent.futures  # noqa: F401
-
-
-# Import requests and miscelaneous libraries
-import requests
+# Import miscelaneous libraries
 import datetime  # noqa: F401
 import json
 import os
+import sqlite3
 from dotenv import load_dotenv
 
 # Import protocols
@@ -34,38 +32,156 @@ from cloudlink.server.protocols import clpv4, scratch
 # Import logging helpers, OceanAudit, and utils
 from logs import Critical, Debug, Error, Info, Warning, Awesome  # noqa: F401
 from oceanaudit import OceanAuditLogger
-from utils import WebSocketRateLimiter, isAuthenticated, Moderator
+from utils import (
+    RateLimitPolicy,
+    SessionRegistry,
+    RoomRegistry,
+    isAuthenticated,
+    Moderator,
+)
 
-# Import DB handler
-from oceandb import OceanDB  # noqa: F401
+# Import DB handler and the timeline cache in front of it
+from oceandb import AsyncOceanDB
+from timeline import TimelineCache
+from users import UserCache
 
+# Import the direct command router and its payloads
+from commands import (
+    CommandRouter,
+    PayloadError,
+    PostSend,
+    PostDelete,
+    PostEdit,
+    Credentials,
+    RetrieveLatest,
+    Room,
+    SessionToken,
+)
 
-# Define timestamp sorting function
-def timestampsort(e):
-    return e[1]
+# Import metrics
+from metrics import Metrics
 
+# Import bridge dispatcher
+from bridge import BridgeDispatcher
 
-# Define function for parallelized POST request
-def post(url, token=None):
-    headers = {}
-    if token:
-        headers = {"Authorization": "Bearer " + token}
-    requests.post(url, headers=headers, timeout=5)
+# Import broadcast fan-out
+from broadcast import Broadcaster
 
 
 # Instantiate server object
 server = server()
 
-# Instantiate ratelimiter
-ratelimiter = WebSocketRateLimiter(5, 1)
-
 # Settings
-SETTINGS = {"bridge_enabled": True, "mlModeration": False}
+SETTINGS = {
+    "bridge_enabled": True,
+    "mlModeration": False,
+    "db_batch_size": 64,
+    "db_batch_interval": 0.05,
+    "db_readers": 4,
+    "bridge_url": "https://splashpost.vercel.app/home/",
+    "bridge_queue_size": 1000,
+    "bridge_batch_size": 16,
+    "audit_buffered": True,
+    "audit_flush_interval": 1.0,
+    "audit_flush_size": 512,
+    "audit_max_bytes": 16 * 1024 * 1024,
+    "audit_rotate_daily": True,
+    # "zstd" needs the optional zstandard package
+    "audit_compression": "gzip",
+    "ml_moderation_timeout": 5,
+    "ml_moderation_fail_open": False,
+    "ml_moderation_threshold": 0.6,
+    # "remote" uses the HuggingFace endpoint, "local" a model file (needs numpy)
+    "ml_moderation_backend": "remote",
+    "local_moderation_model": "moderation.npz",
+    # Token buckets as [tokens, seconds to refill them]
+    "ratelimit_client": [5, 1],
+    "ratelimit_user": [10, 1],
+    "ratelimit_ip": [20, 1],
+    # Tokens charged per direct command, 1 if not listed
+    "ratelimit_costs": {"auth": 3, "genaccount": 4},
+    # Password hashes running at once, and running or queued, across the server
+    "password_workers": 2,
+    "password_max_pending": 16,
+    # Broadcasts waiting for one client before it is too slow
+    "broadcast_max_queue": 256,
+    # Disconnect too slow clients instead of skipping broadcasts for them
+    "broadcast_disconnect_slow": True,
+    # Chat rooms a client can subscribe to at once, besides the limit on names
+    "max_rooms_per_client": 32,
+    "max_room_name_length": 64,
+    # Latency histograms and counters, served at http://127.0.0.1:<port>/metrics
+    "metrics_enabled": True,
+    "metrics_port": 4001,
+    "port": 3000,
+    # bcrypt cost factor of new password hashes
+    "password_rounds": 12,
+    # Newest posts kept in memory per chat, and the memory and chat caps of all of them
+    "timeline_cache_posts": 100,
+    "timeline_cache_max_bytes": 64 * 1024 * 1024,
+    "timeline_cache_chats": 10000,
+    # Cached user records and unknown usernames, and seconds they stay cached
+    "user_cache_size": 10000,
+    "user_cache_missing_size": 10000,
+    "user_cache_ttl": 300,
+    "user_cache_missing_ttl": 30,
+    # Seconds a session token from auth can be used to log back in
+    "session_token_ttl": 7 * 24 * 60 * 60,
+}
+
+# Overrides as a JSON object, e.g. SPLASH_SETTINGS='{"bridge_enabled": false}'
+SETTINGS.update(json.loads(os.getenv("SPLASH_SETTINGS", "{}")))
 
 # Instantiate objects
-db = OceanDB("db")
-audit = OceanAuditLogger()
-moderator = Moderator(SETTINGS["mlModeration"])
+ratelimits = RateLimitPolicy(
+    client=SETTINGS["ratelimit_client"],
+    user=SETTINGS["ratelimit_user"],
+    ip=SETTINGS["ratelimit_ip"],
+    costs=SETTINGS["ratelimit_costs"],
+)
+hasher = PasswordHasher(
+    workers=SETTINGS["password_workers"],
+    max_pending=SETTINGS["password_max_pending"],
+    rounds=SETTINGS["password_rounds"],
+)
+db = AsyncOceanDB(
+    "db",
+    readers=SETTINGS["db_readers"],
+    batch_size=SETTINGS["db_batch_size"],
+    batch_interval=SETTINGS["db_batch_interval"],
+)
+timeline = TimelineCache(
+    db,
+    per_chat=SETTINGS["timeline_cache_posts"],
+    max_bytes=SETTINGS["timeline_cache_max_bytes"],
+    max_chats=SETTINGS["timeline_cache_chats"],
+)
+users = UserCache(
+    db,
+    max_users=SETTINGS["user_cache_size"],
+    max_missing=SETTINGS["user_cache_missing_size"],
+    ttl=SETTINGS["user_cache_ttl"],
+    missing_ttl=SETTINGS["user_cache_missing_ttl"],
+)
+audit = OceanAuditLogger(
+    buffered=SETTINGS["audit_buffered"],
+    flush_interval=SETTINGS["audit_flush_interval"],
+    flush_size=SETTINGS["audit_flush_size"],
+    max_bytes=SETTINGS["audit_max_bytes"],
+    rotate_daily=SETTINGS["audit_rotate_daily"],
+    compression=SETTINGS["audit_compression"],
+)
+moderator = Moderator(
+    SETTINGS["mlModeration"],
+    ml_options={
+        "timeout": SETTINGS["ml_moderation_timeout"],
+        "fail_open": SETTINGS["ml_moderation_fail_open"],
+        "threshold": SETTINGS["ml_moderation_threshold"],
+    },
+    ml_backend=SETTINGS["ml_moderation_backend"],
+    local_model=SETTINGS["local_moderation_model"],
+    local_threshold=SETTINGS["ml_moderation_threshold"],
+)
 
 # Set logging level
 server.logging.basicConfig(level=server.logging.INFO)
@@ -79,31 +195,93 @@ load_dotenv()
 KEY = os.getenv("KEY")
 TOKEN = os.getenv("TOKEN")
 
-authenticated_clients = []
-authenticated_client_usernames = []
+tokens = SessionTokens(KEY, ttl=SETTINGS["session_token_ttl"])  # type: ignore
+if not tokens.enabled:
+    Warning(
+        f"KEY is missing or shorter than {SessionTokens.MIN_KEY_BYTES} bytes,"
+        " session tokens are disabled"
+    )
+tokens.load(db.writer)
+
+# No worker threads when the bridge is off
+bridge = None
+if SETTINGS["bridge_enabled"]:
+    bridge = BridgeDispatcher(
+        SETTINGS["bridge_url"],
+        TOKEN,  # type: ignore
+        max_queue=SETTINGS["bridge_queue_size"],
+        batch_size=SETTINGS["bridge_batch_size"],
+    )
+
+sessions = SessionRegistry()
+
+rooms = RoomRegistry(
+    max_rooms=SETTINGS["max_rooms_per_client"],
+    max_name_length=SETTINGS["max_room_name_length"],
+)
+
+commands = CommandRouter()
+
+broadcaster = Broadcaster(
+    server,
+    max_queue=SETTINGS["broadcast_max_queue"],
+    disconnect_slow=SETTINGS["broadcast_disconnect_slow"],
+)
+
+# Time each stage of handling a command
+metrics = Metrics(SETTINGS["metrics_enabled"])
+metrics.instrument(ratelimits, "ratelimit", "acquire")
+metrics.instrument(moderator, "moderation", "moderate")
+metrics.instrument(db, "db_write", "insert_data", "update_data", "delete_data")
+metrics.instrument(db, "db_read", "select_data", "exists", "select_timeline")
+metrics.instrument(timeline, "timeline", "select_timeline")
+metrics.instrument(users, "user_lookup", "get")
+metrics.instrument(hasher, "password_hash", "hash", "check")
+metrics.instrument(broadcaster, "broadcast", "publish")
+metrics.instrument(audit, "audit", "log_action")
+if bridge is not None:
+    metrics.collect("bridge", bridge.stats)
+metrics.collect("broadcast", broadcaster.stats)
+metrics.collect("password", hasher.stats)
+metrics.collect("timeline_cache", timeline.stats)
+metrics.collect("user_cache", users.stats)
+if moderator.ml_client is not None:
+    metrics.collect("ml_moderation", moderator.ml_client.stats)
+if SETTINGS["metrics_enabled"]:
+    metrics.serve(SETTINGS["metrics_port"])
 
 
 # Event handler for client connection
 @server.on_connect
 async def on_connect(client):
     Info(f"Client {str(client.id)} connected")
+    # Every client follows the home timeline
+    rooms.subscribe(client, "home")
 
 
 # Event handler for client disconnection
 @server.on_disconnect
 async def on_disconnect(client):
     Info(f"Client {str(client.id)} disconnected")
-    if client.id in authenticated_clients:
-        authenticated_client_usernames.remove(client.username)
-        authenticated_clients.remove(client.id)
+    sessions.remove(client.id)
+    ratelimits.remove(client.id)
+    broadcaster.remove(client)
+    rooms.remove(client)
 
 
 # Event handler for direct command
 @server.on_command(cmd="direct", schema=clpv4.schema)
 async def direct(client, message):
     # Rate limiting
-    if not await ratelimiter.acquire(client.id):
-        Info("Ignoring rate limit")
+    command = message["val"].get("cmd") if isinstance(message["val"], dict) else None
+    if not isinstance(command, str):
+        command = None
+    tier = await ratelimits.acquire(
+        client.id, sessions.get(client.id), clpv4.get_client_ip(client), command
+    )
+    if tier:
+        Info(f"Ignoring rate limit ({tier})")
+        metrics.count("ratelimit_hits", tier)
         try:
             server.send_packet_unicast(
                 client,
@@ -121,7 +299,7 @@ async def direct(client, message):
             audit.log_action(
                 "ratelimit",
                 client.username,
-                "User hit rate limit",
+                f"User hit {tier} rate limit on {command}",
             )
         except Exception as e:
             Error(f"Error sending message to client {str(client)}: " + str(e))
@@ -137,499 +315,726 @@ async def direct(client, message):
         Info('Ignoring "Not JSON!" message.')
         return
 
-    # Handle different commands
-    match str(message["val"]["cmd"]):
-        case "post":
-            match str(message["val"]["val"]["type"]):
-                case "send":
-                    if not await isAuthenticated(server, client, authenticated_clients):
-                        return
-                    uid = str(uuid.uuid4())
-                    try:
-                        attachment = str(message["val"]["val"]["attachment"])
-                    except KeyError:
-                        attachment = ""
-
-                    if SETTINGS["mlModeration"]:
-                        if not await moderator.moderate(
-                            str(message["val"]["val"]["p"])
-                        ):
-                            server.send_packet_unicast(
-                                client,
-                                {
-                                    "cmd": "pmsg",
-                                    "val": {
-                                        "cmd": "moderror",
-                                        "val": {
-                                            "message": "Your post got flagged.",
-                                            "post": str(message["val"]["val"]["p"]),
-                                        },
-                                    },
-                                },
-                            )
-                            audit.log_action(
-                                "post_fail",
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ],
-                                f"User tried to post {str(message["val"]["val"]["p"])} but moderation caught it",
-                            )
-                            return
-                    else:
-                        message["val"]["val"]["p"] = await moderator.moderate(
-                            message["val"]["val"]["p"]
-                        )
-                    db.insert_data(
-                        "posts",
-                        (
-                            str(
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ]
-                            ),
-                            float(time.time()),
-                            uid,
-                            str(message["val"]["val"]["p"]),
-                            False,
-                            "home",
-                            str(message["val"]["val"]["type"]),
-                            attachment,
-                            "NULL",
-                        ),
-                    )
-                    server.send_packet_multicast(
-                        server.clients_manager.clients,
-                        {
-                            "cmd": "gmsg",
-                            "val": {
-                                "cmd": "rpost",
-                                "val": {
-                                    "author": authenticated_client_usernames[
-                                        authenticated_clients.index(client.id)
-                                    ],
-                                    "post_content": str(message["val"]["val"]["p"]),
-                                    "uid": uid,
-                                    "attachment": attachment,
-                                },
-                            },
-                        },
-                    )
-                    audit.log_action(
-                        "post",
-                        authenticated_client_usernames[
-                            authenticated_clients.index(client.id)
-                        ],
-                        f"User posted {str(message["val"]["val"]["p"])}",
-                    )
-                    if SETTINGS["bridge_enabled"]:
-                        url = "https://splashpost.vercel.app/home/"
-                        payload = (
-                            authenticated_client_usernames[
-                                authenticated_clients.index(client.id)
-                            ]
-                            + ": "
-                            + str(message["val"]["val"]["p"]).strip()
-                            + (
-                                ""
-                                if attachment == ""
-                                else str(f"[image: {attachment}]")
-                            ),
-                        )
-
-                        with concurrent.futures.ProcessPoolExecutor() as executor:
-                            executor.submit(post, url + str(payload[0]), TOKEN)
-                case "delete":
-                    if not await isAuthenticated(server, client, authenticated_clients):
-                        return
-                    selection = db.select_data(
-                        "posts",
-                        conditions={"uid": str(message["val"]["val"]["uid"])},
-                    )
-                    if selection:
-                        if str(selection[0][0]) == str(
-                            authenticated_client_usernames[
-                                authenticated_clients.index(client.id)
-                            ]
-                        ):
-                            db.update_data(
-                                "posts",
-                                {"isDeleted": True},
-                                {"uid": str(message["val"]["val"]["uid"])},
-                            )
-                            server.send_packet_multicast(
-                                server.clients_manager.clients,
-                                {
-                                    "cmd": "gmsg",
-                                    "val": {
-                                        "cmd": "rdel",
-                                        "val": {
-                                            "uid": str(message["val"]["val"]["uid"])
-                                        },
-                                    },
-                                },
-                            )
-                            audit.log_action(
-                                "delete",
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ],
-                                f"User deleted post with UID {str(message["val"]["val"]["uid"])}",
-                            )
-                        else:
-                            server.send_packet_unicast(
-                                client,
-                                {
-                                    "cmd": "gmsg",
-                                    "val": {
-                                        "cmd": "status",
-                                        "val": {
-                                            "message": "Not authorized",
-                                            "username": authenticated_client_usernames[
-                                                authenticated_clients.index(client.id)
-                                            ],
-                                        },
-                                    },
-                                },
-                            )
-                            audit.log_action(
-                                "delete_fail",
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ],
-                                f"User tried to delete a post with UID {str(message["val"]["val"]["uid"])} that doesn't belong to their account",
-                            )
-                    else:
-                        server.send_packet_unicast(
-                            client,
-                            {
-                                "cmd": "gmsg",
-                                "val": {
-                                    "cmd": "status",
-                                    "val": {
-                                        "message": "Post not found",
-                                        "username": authenticated_client_usernames[
-                                            authenticated_clients.index(client.id)
-                                        ],
-                                    },
-                                },
-                            },
-                        )
-                        audit.log_action(
-                            "delete_fail",
-                            authenticated_client_usernames[
-                                authenticated_clients.index(client.id)
-                            ],
-                            f"User tried to delete a post with UID {str(message["val"]["val"]["uid"])} that didn't exist",
-                        )
-                case "edit":
-                    if not await isAuthenticated(server, client, authenticated_clients):
-                        return
-                    selection = db.select_data(
-                        "posts",
-                        conditions={"uid": str(message["val"]["val"]["uid"])},
-                    )
-                    if selection:
-                        if str(selection[0][0]) != str(
-                            authenticated_client_usernames[
-                                authenticated_clients.index(client.id)
-                            ]
-                        ):
-                            server.send_packet_unicast(
-                                client,
-                                {
-                                    "cmd": "gmsg",
-                                    "val": {
-                                        "cmd": "status",
-                                        "val": {
-                                            "message": "Not authorized",
-                                            "username": authenticated_client_usernames[
-                                                authenticated_clients.index(client.id)
-                                            ],
-                                        },
-                                    },
-                                },
-                            )
-                            audit.log_action(
-                                "edit_fail",
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ],
-                                f"User tried to edit a post with UID {str(message["val"]["val"]["uid"])} that doesn't belong to their account",
-                            )
-                        else:
-                            if SETTINGS["mlModeration"]:
-                                if not await moderator.moderate(
-                                    str(message["val"]["val"]["edit"])
-                                ):
-                                    server.send_packet_unicast(
-                                        client,
-                                        {
-                                            "cmd": "pmsg",
-                                            "val": {
-                                                "cmd": "moderror",
-                                                "val": {
-                                                    "message": "Your edit got flagged.",
-                                                    "post": str(
-                                                        message["val"]["val"]["edit"]
-                                                    ),
-                                                },
-                                            },
-                                        },
-                                    )
-                                    audit.log_action(
-                                        "edit_fail",
-                                        authenticated_client_usernames[
-                                            authenticated_clients.index(client.id)
-                                        ],
-                                        f"User tried to edit {str(message["val"]["val"]["edit"])} but moderation caught it",
-                                    )
-                                    return
-                            else:
-                                message["val"]["val"][
-                                    "edit"
-                                ] = await moderator.moderate(
-                                    message["val"]["val"]["edit"]
-                                )
-                            db.update_data(
-                                "posts",
-                                {
-                                    "content": str(message["val"]["val"]["edit"]),
-                                    "edited_at": time.time(),
-                                },
-                                {"uid": str(message["val"]["val"]["uid"])},
-                            )
-                            server.send_packet_multicast(
-                                server.clients_manager.clients,
-                                {
-                                    "cmd": "gmsg",
-                                    "val": {
-                                        "cmd": "redit",
-                                        "val": {
-                                            "uid": str(message["val"]["val"]["uid"]),
-                                            "edit": str(message["val"]["val"]["edit"]),
-                                        },
-                                    },
-                                },
-                            )
-                            audit.log_action(
-                                "edit",
-                                authenticated_client_usernames[
-                                    authenticated_clients.index(client.id)
-                                ],
-                                f"User edited a post with UID {str(message["val"]["val"]["uid"])}",
-                            )
-                    else:
-                        server.send_packet_unicast(
-                            client,
-                            {
-                                "cmd": "gmsg",
-                                "val": {
-                                    "cmd": "status",
-                                    "val": {
-                                        "message": "Post not found",
-                                        "username": authenticated_client_usernames[
-                                            authenticated_clients.index(client.id)
-                                        ],
-                                    },
-                                },
-                            },
-                        )
-                        audit.log_action(
-                            "edit_fail",
-                            client.username,
-                            f"User tried to edit a post with UID {str(message["val"]["val"]["uid"])} that didn't exist",
-                        )
-
-        case "auth":
-            USER = client.username
-            PASSWORD = message["val"]["val"]["pswd"]
-
-            selection = db.select_data("users", {"username": USER})
-            print(str(selection))
-            if selection:
-                if bcrypt.checkpw(bytes(PASSWORD, "utf-8"), selection[0][9]):
-                    Info(f"Client {str(client.username)} logged in")
-                    token = jwt.encode(
-                        {"username": USER},
-                        str(KEY),
-                        algorithm="HS256",
-                    )
-                    server.send_packet_unicast(
-                        client,
-                        {
-                            "cmd": "pmsg",
-                            "val": {
-                                "cmd": "auth",
-                                "val": {
-                                    "token": token,
-                                    "username": USER,
-                                },
-                            },
+    # Run the handler registered for the command
+    label = command if command in commands.names else "unknown"
+    try:
+        with metrics.time("command", label):
+            handled = await commands.dispatch(client, message["val"])
+    except PayloadError as e:
+        metrics.count("invalid_payloads", label)
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": f"Invalid payload: {e}",
+                        "username": client.username,
+                    },
+                },
+            },
+        )
+        return
+    if not handled:
+        Info(f"Ignoring unknown command {command}")
+
+
+@commands.command("post", PostSend, type="send")
+async def post_send(client, payload):
+    if not await isAuthenticated(server, client, sessions, audit):
+        return
+    username = sessions[client.id]
+    uid = str(uuid.uuid4())
+    if not rooms.valid(payload.c):
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Invalid chat id.",
+                        "username": username,
+                    },
+                },
+            },
+        )
+        return
+
+    content = payload.p
+    if SETTINGS["mlModeration"]:
+        if not await moderator.moderate(content):
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "moderror",
+                        "val": {
+                            "message": "Your post got flagged.",
+                            "post": content,
                         },
-                    )
-                    audit.log_action(
-                        "auth",
-                        client.username,
-                        "User authenticated!",
-                    )
-                    authenticated_clients.append(client.id)
-                    authenticated_client_usernames.append(client.username)
-                else:
-                    server.send_packet_unicast(
-                        client,
-                        {
-                            "cmd": "pmsg",
-                            "val": {
-                                "cmd": "status",
-                                "val": {
-                                    "message": "Invalid password",
-                                    "username": USER,
-                                },
-                            },
+                    },
+                },
+            )
+            audit.log_action(
+                "post_fail",
+                username,
+                f"User tried to post {content} but moderation caught it",
+            )
+            return
+    else:
+        content = await moderator.moderate(content)
+    post = (
+        username,
+        time.time(),
+        uid,
+        content,
+        False,
+        payload.c,
+        "send",
+        payload.attachment,
+        "NULL",
+    )
+    await db.insert_data("posts", post)
+    timeline.insert(post)
+    broadcaster.publish(
+        rooms.members_of(payload.c),
+        {
+            "cmd": "gmsg",
+            "val": {
+                "cmd": "rpost",
+                "val": {
+                    "author": username,
+                    "post_content": content,
+                    "uid": uid,
+                    "attachment": payload.attachment,
+                    "c": payload.c,
+                },
+            },
+        },
+    )
+    audit.log_action(
+        "post",
+        username,
+        f"User posted {content}",
+    )
+    # The bridge mirrors the home timeline only
+    if bridge is not None and payload.c == "home":
+        bridge.submit(
+            username
+            + ": "
+            + content.strip()
+            + ("" if payload.attachment == "" else f"[image: {payload.attachment}]")
+        )
+
+
+@commands.command("post", PostDelete, type="delete")
+async def post_delete(client, payload):
+    if not await isAuthenticated(server, client, sessions, audit):
+        return
+    username = sessions[client.id]
+    selection = await db.select_data(
+        "posts",
+        conditions={"uid": payload.uid},
+        columns=["author", "post_origin"],
+        limit=1,
+        as_rows=True,
+    )
+    if selection:
+        if selection[0].author == username:
+            await db.update_data(
+                "posts",
+                {"isDeleted": True},
+                {"uid": payload.uid},
+            )
+            timeline.remove(selection[0].post_origin, payload.uid)
+            broadcaster.publish(
+                rooms.members_of(selection[0].post_origin),
+                {
+                    "cmd": "gmsg",
+                    "val": {
+                        "cmd": "rdel",
+                        "val": {
+                            "uid": payload.uid,
+                            "c": selection[0].post_origin,
                         },
-                    )
-                    audit.log_action(
-                        "auth_fail",
-                        client.username,
-                        "User failed to auth because of invalid password",
-                    )
-            else:
-                server.send_packet_unicast(
-                    client,
-                    {
-                        "cmd": "direct",
+                    },
+                },
+            )
+            audit.log_action(
+                "delete",
+                username,
+                f"User deleted post with UID {payload.uid}",
+            )
+        else:
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "gmsg",
+                    "val": {
+                        "cmd": "status",
                         "val": {
-                            "cmd": "status",
-                            "val": {
-                                "message": "User doesn't exist",
-                                "username": USER,
-                            },
+                            "message": "Not authorized",
+                            "username": username,
                         },
                     },
-                )
-                audit.log_action(
-                    "auth_fail",
-                    client.username,
-                    f"User tried to log into {USER} but failed because it doesn't exist",
-                )
-        case "retrieve":
-            match str(message["val"]["val"]["type"]):
-                case "latest":
-                    chat_id = message["val"]["val"]["c"]
-                    offset = message["val"]["val"]["o"]
-                    Info(
-                        f"Client {str(client.id)} retrieved latest messages: chat_id: {chat_id}, offset: {offset}"
-                    )
-                    audit.log_action(
-                        "retrieve",
-                        client.username,
-                        f"User retrieved posts with chat id of {chat_id} and offset of {offset}",
-                    )
-                    posts = db.select_data("posts", conditions={"post_origin": chat_id})
-                    # print(posts)
-                    returnposts = []
-                    for i in range(len(posts)):
-                        returnposts.append(posts[-i + 1])
-                        if i == 19:
-                            break
-                    server.send_packet_unicast(
-                        client,
-                        {
-                            "cmd": "pmsg",
-                            "val": {
-                                "cmd": "posts",
-                                "val": {"posts": returnposts},
-                            },
+                },
+            )
+            audit.log_action(
+                "delete_fail",
+                username,
+                f"User tried to delete a post with UID {payload.uid} that doesn't belong to their account",
+            )
+    else:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "gmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Post not found",
+                        "username": username,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "delete_fail",
+            username,
+            f"User tried to delete a post with UID {payload.uid} that didn't exist",
+        )
+
+
+@commands.command("post", PostEdit, type="edit")
+async def post_edit(client, payload):
+    if not await isAuthenticated(server, client, sessions, audit):
+        return
+    username = sessions[client.id]
+    selection = await db.select_data(
+        "posts",
+        conditions={"uid": payload.uid},
+        columns=["author", "post_origin"],
+        limit=1,
+        as_rows=True,
+    )
+    if not selection:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "gmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Post not found",
+                        "username": username,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "edit_fail",
+            client.username,
+            f"User tried to edit a post with UID {payload.uid} that didn't exist",
+        )
+        return
+
+    if selection[0].author != username:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "gmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Not authorized",
+                        "username": username,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "edit_fail",
+            username,
+            f"User tried to edit a post with UID {payload.uid} that doesn't belong to their account",
+        )
+        return
+
+    edit = payload.edit
+    if SETTINGS["mlModeration"]:
+        if not await moderator.moderate(edit):
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "moderror",
+                        "val": {
+                            "message": "Your edit got flagged.",
+                            "post": edit,
                         },
-                    )
-                    returnposts.sort(key=timestampsort, reverse=False)
-        case "genaccount":
-            USER = client.username
-            PASSWORD = message["val"]["val"]["pswd"]
-
-            selection = db.select_data("users", {"username": USER})
-
-            if not selection:
-                try:
-                    pt_pswd = bytes(PASSWORD, "utf-8")
-
-                    salt = bcrypt.gensalt()  # Generate a salt
-                    hashed_password = bcrypt.hashpw(pt_pswd, salt)
-
-                    uid = str(uuid.uuid4())
-                    db.insert_data(
-                        "users",
-                        (
-                            str(USER),
-                            float(time.time()),
-                            uid,
-                            False,
-                            "",
-                            1,
-                            float(time.time()),
-                            json.dumps([]),
-                            json.dumps([]),
-                            hashed_password,
-                        ),
-                    )
-
-                    server.send_packet_unicast(
-                        client,
-                        {
-                            "cmd": "pmsg",
-                            "val": {
-                                "cmd": "createdaccount",
-                                "val": "Welcome to Splash!",
-                            },
+                    },
+                },
+            )
+            audit.log_action(
+                "edit_fail",
+                username,
+                f"User tried to edit {edit} but moderation caught it",
+            )
+            return
+    else:
+        edit = await moderator.moderate(edit)
+    changes = {
+        "content": edit,
+        "edited_at": time.time(),
+    }
+    await db.update_data("posts", changes, {"uid": payload.uid})
+    timeline.update(selection[0].post_origin, payload.uid, changes)
+    broadcaster.publish(
+        rooms.members_of(selection[0].post_origin),
+        {
+            "cmd": "gmsg",
+            "val": {
+                "cmd": "redit",
+                "val": {
+                    "uid": payload.uid,
+                    "edit": edit,
+                    "c": selection[0].post_origin,
+                },
+            },
+        },
+    )
+    audit.log_action(
+        "edit",
+        username,
+        f"User edited a post with UID {payload.uid}",
+    )
+
+
+@commands.command("auth", Credentials)
+async def auth(client, payload):
+    USER = client.username
+
+    user = await users.get(USER)
+    if user is None:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "direct",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "User doesn't exist",
+                        "username": USER,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "auth_fail",
+            client.username,
+            f"User tried to log into {USER} but failed because it doesn't exist",
+        )
+        metrics.count("auth_failures", "no_user")
+        return
+
+    try:
+        valid = await hasher.check(payload.pswd, user.password)
+    except PasswordHasherBusy:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Server busy, try again later.",
+                        "username": USER,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "auth_fail",
+            client.username,
+            "Rejected because too many password hashes are pending",
+        )
+        metrics.count("auth_failures", "busy")
+        return
+
+    if not valid:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Invalid password",
+                        "username": USER,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "auth_fail",
+            client.username,
+            "User failed to auth because of invalid password",
+        )
+        metrics.count("auth_failures", "invalid_password")
+        return
+
+    Info(f"Client {str(client.username)} logged in")
+    token = tokens.issue(USER)
+    server.send_packet_unicast(
+        client,
+        {
+            "cmd": "pmsg",
+            "val": {
+                "cmd": "auth",
+                "val": {
+                    "token": token,
+                    "username": USER,
+                },
+            },
+        },
+    )
+    audit.log_action(
+        "auth",
+        client.username,
+        "User authenticated!",
+    )
+    sessions.add(client.id, client.username)
+
+
+async def check_token(client, token, action):
+    """Verify a client's session token, telling the client if it can't be used."""
+    try:
+        claims = tokens.verify(token)
+        if claims["username"] != client.username:
+            raise InvalidSessionToken("Token belongs to another user")
+        return claims
+    except InvalidSessionToken as e:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Invalid token"
+                        if tokens.enabled
+                        else "Session tokens are disabled",
+                        "username": client.username,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            f"{action}_fail",
+            client.username,
+            f"User presented an invalid session token: {e}",
+        )
+        metrics.count("auth_failures", "invalid_token")
+        return None
+
+
+@commands.command("token", SessionToken)
+async def token_auth(client, payload):
+    USER = client.username
+
+    claims = await check_token(client, payload.token, "auth")
+    if claims is None:
+        return
+
+    # The account may have been deleted since the token was issued
+    if await users.get(USER) is None:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "User doesn't exist",
+                        "username": USER,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "auth_fail",
+            client.username,
+            f"User tried to resume a session of {USER} but it doesn't exist",
+        )
+        metrics.count("auth_failures", "no_user")
+        return
+
+    Info(f"Client {str(client.username)} resumed their session")
+    server.send_packet_unicast(
+        client,
+        {
+            "cmd": "pmsg",
+            "val": {
+                "cmd": "auth",
+                "val": {
+                    "token": payload.token,
+                    "username": USER,
+                },
+            },
+        },
+    )
+    audit.log_action(
+        "auth",
+        client.username,
+        "User authenticated with a session token!",
+    )
+    sessions.add(client.id, client.username)
+
+
+@commands.command("logout", SessionToken)
+async def logout(client, payload):
+    claims = await check_token(client, payload.token, "logout")
+    if claims is None:
+        return
+
+    tokens.revoke(claims)
+    try:
+        await db.insert_data("revoked_tokens", (claims["jti"], claims["exp"]))
+    except sqlite3.IntegrityError:
+        # Revoked twice at once, the first insert is enough
+        pass
+    sessions.remove(client.id)
+    server.send_packet_unicast(
+        client,
+        {
+            "cmd": "pmsg",
+            "val": {
+                "cmd": "logout",
+                "val": {
+                    "username": client.username,
+                },
+            },
+        },
+    )
+    audit.log_action(
+        "logout",
+        client.username,
+        "User logged out and revoked their session token",
+    )
+
+
+@commands.command("retrieve", RetrieveLatest, type="latest")
+async def retrieve_latest(client, payload):
+    # Chat ids are used as cache keys, so bound them like room names
+    if not rooms.valid(payload.c):
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "Invalid chat id.",
+                        "username": client.username,
+                    },
+                },
+            },
+        )
+        return
+    Info(
+        f"Client {str(client.id)} retrieved latest messages: chat_id: {payload.c}, offset: {payload.o}"
+    )
+    audit.log_action(
+        "retrieve",
+        client.username,
+        f"User retrieved posts with chat id of {payload.c} and offset of {payload.o}",
+    )
+    posts = await timeline.select_timeline(
+        payload.c, offset=payload.o, before=payload.b
+    )
+    server.send_packet_unicast(
+        client,
+        {
+            "cmd": "pmsg",
+            "val": {
+                "cmd": "posts",
+                "val": {"posts": posts},
+            },
+        },
+    )
+
+
+async def update_subscription(client, room, subscribe):
+    if not rooms.valid(room):
+        status = "Invalid chat id."
+    elif not subscribe:
+        rooms.unsubscribe(client, room)
+        status = None
+    elif not rooms.subscribe(client, room):
+        status = "Subscribed to too many chats."
+    else:
+        status = None
+
+    if status:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": status,
+                        "username": client.username,
+                    },
+                },
+            },
+        )
+        return
+    server.send_packet_unicast(
+        client,
+        {
+            "cmd": "pmsg",
+            "val": {
+                "cmd": "rooms",
+                "val": {"rooms": sorted(rooms.rooms_of(client))},
+            },
+        },
+    )
+
+
+@commands.command("subscribe", Room)
+async def subscribe(client, payload):
+    await update_subscription(client, payload.c, True)
+
+
+@commands.command("unsubscribe", Room)
+async def unsubscribe(client, payload):
+    await update_subscription(client, payload.c, False)
+
+
+@commands.command("genaccount", Credentials)
+async def genaccount(client, payload):
+    USER = client.username
+
+    if await users.get(USER) is None:
+        try:
+            hashed_password = await hasher.hash(payload.pswd)
+
+            uid = str(uuid.uuid4())
+            await db.insert_data(
+                "users",
+                (
+                    str(USER),
+                    float(time.time()),
+                    uid,
+                    False,
+                    "",
+                    1,
+                    float(time.time()),
+                    json.dumps([]),
+                    json.dumps([]),
+                    hashed_password,
+                ),
+            )
+            users.invalidate(USER)
+
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "createdaccount",
+                        "val": "Welcome to Splash!",
+                    },
+                },
+            )
+            audit.log_action(
+                "created_account",
+                client.username,
+                f"User created account {str(USER)}",
+            )
+        except PasswordHasherBusy:
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "status",
+                        "val": {
+                            "message": "Server busy, try again later.",
+                            "username": USER,
                         },
-                    )
-                    audit.log_action(
-                        "created_account",
-                        client.username,
-                        f"User created account {str(USER)}",
-                    )
-                except Exception as e:
-                    Error(
-                        f"Error creating account for client {str(client.id)}: " + str(e)
-                    )
-                    audit.log_action(
-                        "create_account_fail",
-                        client.username,
-                        f"Failed to create account with username {str(USER)}: {str(e)}",
-                    )
-                    server.send_packet_unicast(
-                        client,
-                        {
-                            "cmd": "pmsg",
-                            "val": {
-                                "cmd": "status",
-                                "val": {
-                                    "message": "An unexpected error occurred.",
-                                    "username": USER,
-                                },
-                            },
+                    },
+                },
+            )
+            audit.log_action(
+                "create_account_fail",
+                client.username,
+                "Rejected because too many password hashes are pending",
+            )
+        except sqlite3.IntegrityError:
+            # Another session registered the same username first
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "status",
+                        "val": {
+                            "message": "User already exists.",
+                            "username": USER,
                         },
-                    )
-
-            else:
-                server.send_packet_unicast(
-                    client,
-                    {
-                        "cmd": "pmsg",
+                    },
+                },
+            )
+            audit.log_action(
+                "create_account_fail",
+                client.username,
+                f"Failed to create account with username {str(USER)} because it already exists",
+            )
+        except Exception as e:
+            Error(f"Error creating account for client {str(client.id)}: " + str(e))
+            audit.log_action(
+                "create_account_fail",
+                client.username,
+                f"Failed to create account with username {str(USER)}: {str(e)}",
+            )
+            server.send_packet_unicast(
+                client,
+                {
+                    "cmd": "pmsg",
+                    "val": {
+                        "cmd": "status",
                         "val": {
-                            "cmd": "status",
-                            "val": {
-                                "message": "User already exists.",
-                                "username": USER,
-                            },
+                            "message": "An unexpected error occurred.",
+                            "username": USER,
                         },
                     },
-                )
-                audit.log_action(
-                    "create_account_fail",
-                    client.username,
-                    f"Failed to create account with username {str(USER)} because it already exists",
-                )
+                },
+            )
+
+    else:
+        server.send_packet_unicast(
+            client,
+            {
+                "cmd": "pmsg",
+                "val": {
+                    "cmd": "status",
+                    "val": {
+                        "message": "User already exists.",
+                        "username": USER,
+                    },
+                },
+            },
+        )
+        audit.log_action(
+            "create_account_fail",
+            client.username,
+            f"Failed to create account with username {str(USER)} because it already exists",
+        )
 
 
 # Start the server
@@ -640,11 +1045,20 @@ Awesome("Started server!")
 def signal_handler(sig, frame):
     print("\n")
     Error(f"Received signal {sig}. Script is terminating.")
+    metrics.close()
+    if bridge is not None:
+        bridge.close()
+    if moderator.ml_client is not None:
+        moderator.ml_client.close()
+    hasher.close()
+    audit.close()
     db.close()
     sys.exit(0)
 
 
 signal.signal(signal.SIGINT, signal_handler)
+# run.py restarts the server with terminate(), which sends SIGTERM
+signal.signal(signal.SIGTERM, signal_handler)
 
 # Run the server
-server.run()
+server.run(port=SETTINGS["port"])
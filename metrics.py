@@ -0,0 +1,224 @@
+import functools
+import http.server
+import inspect
+import math
+import threading
+import time
+
+
+# Histogram buckets grow by 2**(1 / STEPS) from MIN_SECONDS
+MIN_SECONDS = 1e-6
+STEPS = 4
+BUCKETS = STEPS * 27
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets.
+
+    Buckets grow by 2**0.25 (about 19%) from 1 microsecond to about 2
+    minutes, so memory stays constant and quantiles are accurate to within
+    one bucket.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        if seconds > MIN_SECONDS:
+            index = int(math.log2(seconds / MIN_SECONDS) * STEPS) + 1
+            self.counts[index if index < BUCKETS else BUCKETS - 1] += 1
+        else:
+            self.counts[0] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(MIN_SECONDS * 2 ** (index / STEPS), self.max)
+        return self.max
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_TIMER = _NoTimer()
+
+
+class Metrics:
+    """
+    Per-stage latency histograms and event counters for the server.
+
+    Stages are timed with `with metrics.time("stage"):` or by wrapping
+    methods with instrument(). Stats dicts that components already keep,
+    like the bridge's, are exported with collect(). render() returns
+    everything in the Prometheus text format, and serve() exposes it at
+    /metrics from a background thread. When disabled, time() returns a
+    shared no-op, instrument() leaves methods untouched and count() returns
+    right away.
+
+    Args:
+        enabled (bool): Whether to record anything.
+        prefix (str): Prefix of every exported metric name.
+
+    Methods:
+        time(stage: str, label: str = None): Context manager timing a stage.
+        instrument(obj, stage: str, *methods: str): Time calls to obj's methods.
+        count(name: str, label: str = None, amount: int = 1): Increment a counter.
+        collect(name: str, stats: dict): Export a component's counters.
+        render() -> str: All metrics in the Prometheus text format.
+        serve(port: int, host: str = "127.0.0.1"): Serve /metrics over HTTP.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, enabled=True, prefix="splash"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.collected = {}
+        self.server = None
+
+    def histogram(self, stage, label=None):
+        key = (stage, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    def time(self, stage, label=None):
+        if not self.enabled:
+            return NO_TIMER
+        return _Timer(self.histogram(stage, label))
+
+    def instrument(self, obj, stage, *methods):
+        """Replace obj's methods with versions that time every call."""
+        if not self.enabled:
+            return
+        histogram = self.histogram(stage)
+        for name in methods:
+            method = getattr(obj, name)
+            if inspect.iscoroutinefunction(method):
+
+                @functools.wraps(method)
+                async def timed(*args, _method=method, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await _method(*args, **kwargs)
+                    finally:
+                        histogram.observe(time.perf_counter() - start)
+
+            else:
+
+                @functools.wraps(method)
+                def timed(*args, _method=method, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return _method(*args, **kwargs)
+                    finally:
+                        histogram.observe(time.perf_counter() - start)
+
+            setattr(obj, name, timed)
+
+    def count(self, name, label=None, amount=1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def collect(self, name, stats):
+        """Export every key of a stats dict as a counter, read when rendering."""
+        self.collected[name] = stats
+
+    def render(self):
+        lines = []
+        stage_metric = f"{self.prefix}_stage_seconds"
+        lines.append(f"# TYPE {stage_metric} summary")
+        for (stage, label), histogram in sorted(
+            list(self.histograms.items()), key=lambda item: str(item[0])
+        ):
+            labels = f'stage="{stage}"' + (f',command="{label}"' if label else "")
+            for q in self.QUANTILES:
+                lines.append(
+                    f'{stage_metric}{{{labels},quantile="{q}"}} {histogram.quantile(q):.9f}'
+                )
+            lines.append(f"{stage_metric}_sum{{{labels}}} {histogram.total:.9f}")
+            lines.append(f"{stage_metric}_count{{{labels}}} {histogram.count}")
+
+        names = {}
+        for (name, label), value in list(self.counters.items()):
+            names.setdefault(name, []).append((label, value))
+        for component, stats in list(self.collected.items()):
+            for key, value in list(stats.items()):
+                names.setdefault(f"{component}_{key}", []).append((None, value))
+        for name in sorted(names):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for label, value in sorted(names[name], key=lambda item: str(item[0])):
+                labels = f'{{kind="{label}"}}' if label is not None else ""
+                lines.append(f"{metric}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve render() at /metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics", daemon=True
+        ).start()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,195 @@
+from logs import Info, Warning  # noqa: F401
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class MLModerationClient:
+    """
+    Awaitable client for a HuggingFace-style text classification endpoint.
+
+    Texts moderated at about the same time are sent together in one
+    inference call. Requests run on a small thread pool over a pooled
+    requests.Session, so the event loop never waits on the network.
+    Verdicts are cached by content hash, and a text that is already waiting
+    for a batch or being classified shares that result instead of being
+    sent again. When the endpoint fails or times out, the text is allowed
+    if fail_open is set and rejected otherwise.
+
+    Args:
+        url (str): The inference endpoint.
+        token (str): Bearer token for the endpoint.
+        threshold (float): Highest toxicity score that is still allowed.
+        batch_size (int): Maximum number of texts per inference call.
+        batch_window (float): Seconds to wait for more texts before sending a batch.
+        timeout (float): Timeout of an inference call in seconds.
+        fail_open (bool): Allow texts when the endpoint can't be reached.
+        cache_size (int): Maximum number of cached verdicts.
+        cache_ttl (float): Seconds a cached verdict stays valid.
+        workers (int): Number of concurrent inference calls.
+
+    Attributes:
+        stats (dict): Counters for cache hits and misses, calls and failures.
+
+    Methods:
+        is_allowed(text: str) -> bool: Check whether a text passes moderation.
+        close(): Stop the request threads and close the HTTP session.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: str = None,  # type: ignore
+        threshold: float = 0.6,
+        batch_size: int = 16,
+        batch_window: float = 0.01,
+        timeout: float = 5,
+        fail_open: bool = False,
+        cache_size: int = 10000,
+        cache_ttl: float = 3600,
+        workers: int = 4,
+    ) -> None:
+        self.url = url
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.fail_open = fail_open
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = collections.OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "calls": 0, "failures": 0}
+
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=workers))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+        if token:
+            self.session.headers["Authorization"] = "Bearer " + token
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="mlmoderation"
+        )
+
+        # Texts waiting for the next batch, by content hash
+        self.pending = {}
+        # Futures of texts that are pending or being classified, by content hash
+        self.futures = {}
+        self.flush_handle = None
+
+    def _cached(self, key: str) -> bool | None:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        verdict, expires = entry
+        if expires < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return verdict
+
+    def _store(self, key: str, verdict: bool) -> None:
+        self.cache[key] = (verdict, time.monotonic() + self.cache_ttl)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def is_allowed(self, text: str) -> bool:
+        """
+        Check whether a text passes moderation.
+
+        Args:
+            text (str): The text to classify.
+
+        Returns:
+            bool: True if the text's toxicity score is at most the threshold.
+        """
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        verdict = self._cached(key)
+        if verdict is not None:
+            self.stats["hits"] += 1
+            return verdict
+        self.stats["misses"] += 1
+
+        # Identical texts already waiting or in flight share one result
+        if key in self.futures:
+            return await asyncio.shield(self.futures[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[key] = (text, future)
+        self.futures[key] = future
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            asyncio.get_running_loop().create_task(self._classify(batch))
+
+    async def _classify(self, batch: dict) -> None:
+        keys = list(batch)
+        texts = [batch[key][0] for key in keys]
+        loop = asyncio.get_running_loop()
+        self.stats["calls"] += 1
+        try:
+            scores = await loop.run_in_executor(self.executor, self._request, texts)
+        except Exception as e:
+            self.stats["failures"] += 1
+            Warning(
+                f"ML moderation failed, {'allowing' if self.fail_open else 'rejecting'}: {e}"
+            )
+            scores = None
+
+        for i, key in enumerate(keys):
+            if scores is None:
+                verdict = self.fail_open
+            else:
+                verdict = scores[i] <= self.threshold
+                self._store(key, verdict)
+            self.futures.pop(key, None)
+            if not batch[key][1].done():
+                batch[key][1].set_result(verdict)
+
+    def _request(self, texts: list) -> list:
+        response = self.session.post(
+            self.url, json={"inputs": texts}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, list) or len(data) != len(texts):
+            raise ValueError(f"Unexpected inference response: {str(data)[:200]}")
+
+        scores = []
+        for labels in data:
+            if not isinstance(labels, list) or not labels:
+                raise ValueError(f"Unexpected inference response: {str(data)[:200]}")
+            # Prefer the "toxic" label, fall back to the top label's score
+            scores.append(
+                next(
+                    (
+                        label["score"]
+                        for label in labels
+                        if label.get("label") == "toxic"
+                    ),
+                    labels[0].get("score", 0),
+                )
+            )
+        return scores
+
+    def close(self) -> None:
+        """
+        Stop the request threads and close the HTTP session.
+        """
+        self.executor.shutdown(wait=False)
+        self.session.close()
+        Info(f"Closed ML moderation client: {self.stats}")
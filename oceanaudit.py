@@ -1,10 +1,112 @@
+import argparse
+import atexit
+import gzip
+import io
 import json
-from datetime import datetime
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+# zstd compression is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File locks that keep a second logger off the same log
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Queue marker that makes the flusher write its current batch right away
+FLUSH = object()
+
+
+class AuditLogInUse(Exception):
+    """Raised when another logger is already writing to the same audit log."""
 
 
 class OceanAuditLogger:
-    def __init__(self, log_file_path="audit.log"):
+    """
+    Appends audit entries to a log file and rotates it into compressed segments.
+
+    Only one logger may write to a log at a time: rotation moves the file
+    away, so entries another writer appended would be lost. The logger
+    holds an exclusive lock on `<log>.lock` from creation until close(),
+    and creating a second logger for the same log raises AuditLogInUse.
+
+    A buffered logger writes what is queued when the process exits. atexit
+    handlers don't run when SIGTERM kills the process, so it also closes
+    itself on SIGTERM before passing the signal on to the handler that was
+    installed before it, or to the default one.
+    """
+
+    def __init__(
+        self,
+        log_file_path="audit.log",
+        buffered=False,
+        flush_interval=1.0,
+        flush_size=512,
+        max_queue=10000,
+        max_bytes=None,
+        rotate_daily=False,
+        compression="gzip",
+    ):
         self.log_file_path = log_file_path
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        # Serializes file writes between the flusher and the overflow path
+        self.lock = threading.Lock()
+        self.closed = False
+
+        # Rotation into compressed segments listed in a manifest
+        if compression not in ("gzip", "zstd"):
+            raise ValueError(f"Unknown audit log compression {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compression = compression
+        self.manifest_path = log_file_path + ".manifest.json"
+        self.index_path = log_file_path + ".index.json"
+        self.rotating_path = log_file_path + ".rotating"
+        self.lock_file = None
+        self._lock()
+        # Finish a rotation that was interrupted after moving the log away
+        if os.path.exists(self.rotating_path):
+            self._compress(self.rotating_path)
+        self._scan_active_log()
+
+        if buffered:
+            self.queue = queue.Queue(maxsize=max_queue)
+            self.thread = threading.Thread(
+                target=self._run, name="oceanaudit", daemon=True
+            )
+            self.thread.start()
+            atexit.register(self.close)
+            self._close_on_sigterm()
+
+    def _close_on_sigterm(self):
+        # Signal handlers can only be set from the main thread
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handler(signum, frame):
+            self.close()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+
+        signal.signal(signal.SIGTERM, handler)
 
     def log_action(self, action_type, user, details):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -14,8 +116,337 @@ class OceanAuditLogger:
             "user": user,
             "details": details,
         }
-        self._write_to_log(log_entry)
+        if not self.buffered or self.closed:
+            self._write_to_log(log_entry)
+            return
+
+        try:
+            self.queue.put_nowait(log_entry)
+        except queue.Full:
+            # Never lose audit events, fall back to writing directly
+            self._write_to_log(log_entry)
 
     def _write_to_log(self, log_entry):
-        with open(self.log_file_path, "a") as log_file:
-            log_file.write(json.dumps(log_entry) + "\n")
+        self._write_batch([log_entry])
+
+    def _write_batch(self, log_entries):
+        with self.lock:
+            # Entries logged after close() take the lock again
+            self._lock()
+            lines = []
+            for log_entry in log_entries:
+                line = (json.dumps(log_entry) + "\n").encode("utf-8")
+                # Checked per entry, so a batch can't take the log past
+                # max_bytes or into the next day
+                if self._rotation_due(log_entry["timestamp"], len(line)):
+                    self._append(lines)
+                    lines = []
+                    self._rotate()
+                lines.append(line)
+                self.active_bytes += len(line)
+                self.active_entries += 1
+                self.active_start = self.active_start or log_entry["timestamp"]
+            self._append(lines)
+
+    def _append(self, lines):
+        if lines:
+            with open(self.log_file_path, "ab") as log_file:
+                log_file.write(b"".join(lines))
+
+    def _lock(self):
+        if self.lock_file is not None:
+            return
+        lock_file = open(self.log_file_path + ".lock", "wb")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise AuditLogInUse(
+                f"{self.log_file_path} is already open in another OceanAuditLogger"
+            ) from None
+        self.lock_file = lock_file
+
+    def _unlock(self):
+        # Closing the file releases the lock
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def _scan_active_log(self):
+        self.active_bytes = 0
+        self.active_entries = 0
+        self.active_start = None
+        if not os.path.exists(self.log_file_path):
+            return
+
+        self.active_bytes = os.path.getsize(self.log_file_path)
+        with open(self.log_file_path, "r") as log_file:
+            for log_entry in _parse_lines(log_file):
+                self.active_entries += 1
+                self.active_start = self.active_start or log_entry["timestamp"]
+
+    def _rotation_due(self, timestamp, size):
+        if not self.active_entries:
+            return False
+        if self.max_bytes and self.active_bytes + size > self.max_bytes:
+            return True
+        # Timestamps start with the date, so compare that part
+        return self.rotate_daily and self.active_start[:10] != timestamp[:10]
+
+    def read_manifest(self):
+        """Return the list of rotated segments, oldest first."""
+        return _read_json(self.manifest_path, {"segments": []})["segments"]
+
+    def _rotate(self):
+        # Move the log away first so nothing is appended while it's compressed
+        os.replace(self.log_file_path, self.rotating_path)
+        self.active_bytes = 0
+        self.active_entries = 0
+        self.active_start = None
+        self._compress(self.rotating_path)
+
+    def _compress(self, source_path):
+        """Compress a moved-away log into the next segment and index it."""
+        segments = self.read_manifest()
+        extension = "gz" if self.compression == "gzip" else "zst"
+        segment_path = f"{self.log_file_path}.{len(segments) + 1:06d}.{extension}"
+
+        # The segment's metadata comes from the entries it actually holds
+        entries = 0
+        start = end = None
+        users, actions = set(), set()
+        with open(source_path, "rb") as source:
+            with open(segment_path + ".tmp", "wb") as target:
+                if self.compression == "gzip":
+                    compressed = gzip.GzipFile(fileobj=target, mode="wb")
+                else:
+                    compressed = zstandard.ZstdCompressor().stream_writer(
+                        target, closefd=False
+                    )
+                with compressed:
+
+                    def copied_lines():
+                        for line in source:
+                            compressed.write(line)
+                            yield line
+
+                    for log_entry in _parse_lines(copied_lines()):
+                        entries += 1
+                        start = start or log_entry["timestamp"]
+                        end = log_entry["timestamp"]
+                        users.add(log_entry["user"])
+                        actions.add(log_entry["action_type"])
+        os.replace(segment_path + ".tmp", segment_path)
+
+        segments.append(
+            {
+                "path": os.path.basename(segment_path),
+                "start": start,
+                "end": end,
+                "entries": entries,
+                "bytes": os.path.getsize(source_path),
+                "compressed_bytes": os.path.getsize(segment_path),
+            }
+        )
+        _write_json(self.manifest_path, {"segments": segments})
+
+        # Record who and what the segment contains for OceanAuditQuery
+        index = _read_json(self.index_path, {"segments": {}})
+        index["segments"][os.path.basename(segment_path)] = _postings(users, actions)
+        _write_json(self.index_path, index)
+
+        os.remove(source_path)
+
+    def _run(self):
+        while True:
+            log_entry = self.queue.get()
+            if log_entry is None:
+                self.queue.task_done()
+                return
+            if log_entry is FLUSH:
+                self.queue.task_done()
+                continue
+
+            # Collect entries until the batch is full or the interval is over
+            batch = [log_entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            markers = 0
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    log_entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if log_entry is None or log_entry is FLUSH:
+                    stop = log_entry is None
+                    markers = 1
+                    break
+                batch.append(log_entry)
+
+            self._write_batch(batch)
+            for _ in range(len(batch) + markers):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        if self.buffered and not self.closed:
+            self.queue.put(FLUSH)
+            self.queue.join()
+
+    def close(self):
+        """Write every queued entry, stop the flusher thread and unlock the log."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.buffered:
+            self.queue.put(None)
+            self.thread.join()
+        with self.lock:
+            self._unlock()
+
+
+def open_segment(path):
+    """Open an audit log file or rotated segment for reading text lines."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("Reading zstd segments requires the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r")
+
+
+class OceanAuditQuery:
+    """
+    Streams audit log entries matching a user, action type and time range.
+
+    Rotated segments whose time range, users or action types (taken from
+    the manifest and the sidecar index) can't match are skipped without
+    being opened. Only the remaining segments and the active file are read.
+    """
+
+    def __init__(self, log_file_path="audit.log"):
+        self.log_file_path = log_file_path
+        self.manifest_path = log_file_path + ".manifest.json"
+        self.index_path = log_file_path + ".index.json"
+        self.directory = os.path.dirname(log_file_path)
+
+    def build_index(self):
+        """Index segments missing from the sidecar index and return the index."""
+        index = _read_json(self.index_path, {"segments": {}})
+        changed = False
+        for segment in _read_json(self.manifest_path, {"segments": []})["segments"]:
+            if segment["path"] in index["segments"]:
+                continue
+            users, actions = set(), set()
+            with open_segment(os.path.join(self.directory, segment["path"])) as f:
+                for log_entry in _parse_lines(f):
+                    users.add(log_entry["user"])
+                    actions.add(log_entry["action_type"])
+            index["segments"][segment["path"]] = _postings(users, actions)
+            changed = True
+
+        if changed:
+            _write_json(self.index_path, index)
+        return index
+
+    def query(self, user=None, action_type=None, since=None, until=None):
+        """
+        Yield matching entries, oldest first.
+
+        since and until are timestamps like "2024-04-23 18:00:00" or a prefix
+        of one such as "2024-04-23"; both ends are inclusive.
+        """
+        index = self.build_index()["segments"]
+        paths = []
+        for segment in _read_json(self.manifest_path, {"segments": []})["segments"]:
+            if since and segment["end"] < since:
+                continue
+            if until and segment["start"][: len(until)] > until:
+                continue
+            postings = index[segment["path"]]
+            if user is not None and user not in postings["users"]:
+                continue
+            if action_type is not None and action_type not in postings["action_types"]:
+                continue
+            paths.append(os.path.join(self.directory, segment["path"]))
+
+        if os.path.exists(self.log_file_path):
+            paths.append(self.log_file_path)
+
+        for path in paths:
+            with open_segment(path) as f:
+                for log_entry in _parse_lines(f):
+                    if user is not None and log_entry["user"] != user:
+                        continue
+                    if (
+                        action_type is not None
+                        and log_entry["action_type"] != action_type
+                    ):
+                        continue
+                    if since and log_entry["timestamp"] < since:
+                        continue
+                    if until and log_entry["timestamp"][: len(until)] > until:
+                        continue
+                    yield log_entry
+
+
+def _parse_lines(lines):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def _postings(users, actions):
+    return {
+        "users": sorted(users, key=str),
+        "action_types": sorted(actions, key=str),
+    }
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the Splash audit log")
+    parser.add_argument("--log", default="audit.log", help="path of the active log")
+    parser.add_argument("--user", help="only entries by this user")
+    parser.add_argument("--action", help="only entries with this action type")
+    parser.add_argument("--since", help='start timestamp, e.g. "2024-04-23"')
+    parser.add_argument("--until", help="end timestamp, inclusive")
+    parser.add_argument("--days", type=int, help="only entries from the last N days")
+    args = parser.parse_args()
+
+    since = args.since
+    if args.days is not None:
+        since = (datetime.now() - timedelta(days=args.days)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+
+    search = OceanAuditQuery(args.log).query(
+        user=args.user, action_type=args.action, since=since, until=args.until
+    )
+    for log_entry in search:
+        print(json.dumps(log_entry))
@@ -1,40 +1,120 @@
 from logs import Info, Warning, Debug, Error, Critical, Awesome  # noqa: F401
 import sqlite3  # noqa: F401
+import argparse
+import threading
+import asyncio
+import concurrent.futures
+import collections
+import itertools
 import json
 
 
+# Row classes by table and selected columns, shared by all connections
+_row_types = {}
+
+
+def row_type(table_name: str, columns: tuple) -> type:
+    """
+    Get the row class for a table's columns.
+
+    Rows are namedtuples, which have empty __slots__, so they cost no more
+    memory than plain tuples and still support indexing, while columns can
+    be read by name.
+    """
+    key = (table_name, columns)
+    cls = _row_types.get(key)
+    if cls is None:
+        cls = _row_types[key] = collections.namedtuple(
+            f"{table_name.title().replace('_', '')}Row", columns, rename=True
+        )
+    return cls
+
+
+def _order_by(order_by: str) -> str:
+    """
+    Check an ORDER BY clause such as "creation_date DESC, uid".
+    """
+    for term in order_by.split(","):
+        parts = term.split()
+        if not (
+            1 <= len(parts) <= 2
+            and parts[0].isidentifier()
+            and (len(parts) == 1 or parts[1].upper() in ("ASC", "DESC"))
+        ):
+            raise ValueError(f"Invalid ORDER BY term: {term.strip()!r}")
+    return order_by
+
+
 class OceanDB:
     """
     A simple SQLite database wrapper for basic CRUD operations.
 
     Args:
         db_name (str): The name of the database.
+        batch_size (int): Number of writes grouped into a single commit.
+        batch_interval (float): Maximum seconds a write waits for its commit.
 
     Attributes:
         db_name (str): The name of the database.
         conn (sqlite3.Connection): The SQLite database connection.
         cursor (sqlite3.Cursor): The database cursor.
+        batch_size (int): Number of writes grouped into a single commit.
+        batch_interval (float): Maximum seconds a write waits for its commit.
 
     Methods:
         commit(): Commit the changes to the database.
+        flush(): Commit all pending batched writes.
         table_exists(table_name: str) -> bool: Check if a table exists in the database.
+        sync_indexes(table_name: str, schema: dict): Create or rebuild the indexes declared for a table.
         insert_data(table_name: str, values: tuple): Insert data into the specified table.
-        select_data(table_name: str, conditions: dict = None) -> list: Retrieve data from the specified table.
+        select_data(table_name: str, conditions: dict = None, columns: list = None, order_by: str = None, limit: int = None, as_rows: bool = False) -> list: Retrieve data from the specified table.
+        iter_data(table_name: str, conditions: dict = None, columns: list = None, order_by: str = None, batch_size: int = 1000, as_rows: bool = False): Stream rows from the specified table.
+        exists(table_name: str, conditions: dict = None) -> bool: Check if any row matches.
+        select_timeline(post_origin: str, offset: int = 0, limit: int = 20, before: float = None) -> list: Retrieve a page of posts from a chat.
         update_data(table_name: str, update_data: dict, conditions: dict = None): Update data in the specified table.
         delete_data(table_name: str, conditions: dict = None): Delete data from the specified table.
         close(): Close the database connection.
     """
 
-    def __init__(self, db_name: str) -> None:
+    def __init__(
+        self,
+        db_name: str,
+        batch_size: int = 1,
+        batch_interval: float = 0.05,
+        read_only: bool = False,
+    ) -> None:
         """
         Initialize the OceanDB instance.
 
+        With the default batch_size of 1 every write is committed right away.
+        Larger values group writes into one transaction, committed once
+        batch_size writes are pending or batch_interval seconds after the
+        first of them, whichever comes first.
+
         Args:
             db_name (str): The name of the database.
+            batch_size (int): Number of writes grouped into a single commit.
+            batch_interval (float): Maximum seconds a write waits for its commit.
+            read_only (bool): Open an existing database without touching its schema.
         """
         self.db_name = db_name
-        self.conn = sqlite3.connect(f"{db_name}.sqlite")
+        self.batch_size = max(int(batch_size), 1)
+        self.batch_interval = batch_interval
+        self.pending_writes = 0
+        self.flush_timer = None
+        # Guards the connection against the flush timer thread
+        self.lock = threading.RLock()
+        if read_only:
+            self.conn = sqlite3.connect(
+                f"file:{db_name}.sqlite?mode=ro", uri=True, check_same_thread=False
+            )
+            self.cursor = self.conn.cursor()
+            return
+
+        self.conn = sqlite3.connect(f"{db_name}.sqlite", check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.cursor.execute("PRAGMA journal_mode=WAL")
+        self.cursor.execute("PRAGMA synchronous=NORMAL")
         Awesome(f"Connected to {db_name}.sqlite!")
         with open("db.json", "r") as f:
             data = json.load(f)
@@ -43,6 +123,9 @@ class OceanDB:
             if not self.table_exists(table):
                 sql = f"CREATE TABLE IF NOT EXISTS {table} ("
                 for name, type in columns.items():
+                    # Keys starting with an underscore hold table metadata
+                    if name.startswith("_"):
+                        continue
                     sql += f"{name} {type}, "
 
                 # Trim trailing comma and add closing parenthesis
@@ -51,12 +134,38 @@ class OceanDB:
                 self.cursor.execute(sql)
                 self.commit()
 
+            self.sync_indexes(table, columns)
+
     def commit(self) -> None:
         """
         Commit changes to the database.
         """
         self.conn.commit()
 
+    def flush(self) -> None:
+        """
+        Commit all pending batched writes.
+        """
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if self.pending_writes:
+                self.commit()
+                self.pending_writes = 0
+
+    def _written(self) -> None:
+        """
+        Record a write, committing it now or scheduling it with the batch.
+        """
+        self.pending_writes += 1
+        if self.pending_writes >= self.batch_size:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = threading.Timer(self.batch_interval, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+
     def table_exists(self, table_name: str) -> bool:
         """
         Check if a table exists in the database.
@@ -72,6 +181,68 @@ class OceanDB:
         )
         return bool(self.cursor.fetchone())
 
+    def sync_indexes(self, table_name: str, schema: dict) -> None:
+        """
+        Reconcile the indexes of a table with the ones declared in db.json.
+
+        Indexes listed under "_indexes" and "_unique" are created when missing
+        and rebuilt when their columns or uniqueness changed. Indexes that are
+        not declared are left untouched.
+
+        Args:
+            table_name (str): The name of the table.
+            schema (dict): The table's entry from db.json.
+        """
+        declared = {}
+        for index, columns in schema.get("_indexes", {}).items():
+            declared[index] = (list(columns), False)
+        for index, columns in schema.get("_unique", {}).items():
+            declared[index] = (list(columns), True)
+
+        existing = {}
+        self.cursor.execute(f"PRAGMA index_list({table_name})")
+        for row in self.cursor.fetchall():
+            # Skip indexes SQLite creates on its own for table constraints
+            if row[1].startswith("sqlite_autoindex_"):
+                continue
+            existing[row[1]] = bool(row[2])
+
+        self.commit()
+        for index, (columns, unique) in declared.items():
+            # sqlite3 doesn't open a transaction for DDL on its own, and SQLite
+            # can't rename an index, so the old index is dropped and the new
+            # one created in one transaction. If the new one can't be built,
+            # rolling back restores the old one.
+            rebuild = False
+            if index in existing:
+                self.cursor.execute(f"PRAGMA index_info({index})")
+                current = [row[2] for row in self.cursor.fetchall()]
+                if current == columns and existing[index] == unique:
+                    continue
+                Warning(f"Rebuilding index {index} on {table_name}")
+                rebuild = True
+
+            self.cursor.execute("BEGIN")
+            try:
+                if rebuild:
+                    self.cursor.execute(f"DROP INDEX {index}")
+                self.cursor.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} "
+                    f"ON {table_name} ({', '.join(columns)})"
+                )
+                self.conn.commit()
+                Info(f"Created index {index} on {table_name}")
+            except sqlite3.IntegrityError as e:
+                self.conn.rollback()
+                Error(f"Could not create unique index {index} on {table_name}: {e}")
+            except BaseException:
+                # Don't leave the transaction open for later batched writes
+                self.conn.rollback()
+                raise
+
+        for index in existing.keys() - declared.keys():
+            Warning(f"Index {index} on {table_name} is not declared in db.json")
+
     def insert_data(self, table_name: str, values: tuple) -> None:
         """
         Insert data into the specified table.
@@ -79,31 +250,197 @@ class OceanDB:
         Args:
             table_name (str): The name of the table.
             values (tuple): The values to be inserted.
+
+        Raises:
+            sqlite3.IntegrityError: If the row violates a unique index.
         """
         placeholders = ",".join(["?" for _ in values])
         sql = f"INSERT INTO {table_name} VALUES ({placeholders})"
-        self.cursor.execute(sql, values)
-        self.commit()
+        with self.lock:
+            self.cursor.execute(sql, values)
+            self._written()
 
-    def select_data(self, table_name: str, conditions: dict = None) -> list:  # type: ignore
+    def select_data(
+        self,
+        table_name: str,
+        conditions: dict = None,  # type: ignore
+        columns: list = None,  # type: ignore
+        order_by: str = None,  # type: ignore
+        limit: int = None,  # type: ignore
+        as_rows: bool = False,
+    ) -> list:
         """
         Retrieve data from the specified table.
 
         Args:
             table_name (str): The name of the table.
             conditions (dict): Conditions to filter the results.
+            columns (list): The columns to select, all of them by default.
+            order_by (str): ORDER BY clause, e.g. "creation_date DESC".
+            limit (int): Maximum number of rows to return.
+            as_rows (bool): Return rows whose columns can be read by name.
 
         Returns:
             list: A list of tuples representing the selected data.
         """
-        query = f"SELECT * FROM {table_name}"
+        query, params = self._select_query(
+            table_name, conditions, columns, order_by, limit
+        )
+
+        with self.lock:
+            self.cursor.execute(query, params)
+            rows = self.cursor.fetchall()
+            if as_rows and not columns:
+                columns = [column[0] for column in self.cursor.description]
+        if as_rows:
+            cls = row_type(table_name, tuple(columns))
+            return [cls._make(row) for row in rows]
+        return rows
+
+    def iter_data(
+        self,
+        table_name: str,
+        conditions: dict = None,  # type: ignore
+        columns: list = None,  # type: ignore
+        order_by: str = None,  # type: ignore
+        batch_size: int = 1000,
+        as_rows: bool = False,
+    ):
+        """
+        Stream rows from the specified table without loading them all at once.
+
+        Rows are fetched batch_size at a time on a cursor of their own, so
+        other queries can run between batches. The whole iteration reads
+        one snapshot of the database. Stop early by closing the generator,
+        or just stop iterating.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions to filter the results.
+            columns (list): The columns to select, all of them by default.
+            order_by (str): ORDER BY clause, e.g. "creation_date DESC".
+            batch_size (int): Number of rows fetched at a time.
+            as_rows (bool): Yield rows whose columns can be read by name.
+
+        Yields:
+            tuple: Each selected row.
+        """
+        query, params = self._select_query(table_name, conditions, columns, order_by)
+        batch_size = max(int(batch_size), 1)
+
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute(query, params)
+            if as_rows and not columns:
+                columns = [column[0] for column in cursor.description]
+        make = row_type(table_name, tuple(columns))._make if as_rows else None
+        try:
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                if make is None:
+                    yield from rows
+                else:
+                    for row in rows:
+                        yield make(row)
+        finally:
+            with self.lock:
+                cursor.close()
+
+    def _select_query(
+        self,
+        table_name: str,
+        conditions: dict = None,  # type: ignore
+        columns: list = None,  # type: ignore
+        order_by: str = None,  # type: ignore
+        limit: int = None,  # type: ignore
+    ) -> tuple:
+        """
+        Build the SELECT statement and parameters of select_data and iter_data.
+        """
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+        params = tuple(conditions.values()) if conditions else ()
 
         if conditions:
             conditions_str = " AND ".join([f"{key} = ?" for key in conditions])
             query += f" WHERE {conditions_str}"
 
-        self.cursor.execute(query, tuple(conditions.values()) if conditions else ())
-        return self.cursor.fetchall()
+        if order_by:
+            query += f" ORDER BY {_order_by(order_by)}"
+
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (max(int(limit), 0),)
+
+        return query, params
+
+    def exists(self, table_name: str, conditions: dict = None) -> bool:  # type: ignore
+        """
+        Check if any row of the specified table matches the conditions.
+
+        Stops at the first match without reading any column.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions the row has to match.
+
+        Returns:
+            bool: True if a row matches, False otherwise.
+        """
+        query = f"SELECT 1 FROM {table_name}"
+
+        if conditions:
+            conditions_str = " AND ".join([f"{key} = ?" for key in conditions])
+            query += f" WHERE {conditions_str}"
+
+        with self.lock:
+            self.cursor.execute(
+                query + " LIMIT 1", tuple(conditions.values()) if conditions else ()
+            )
+            return self.cursor.fetchone() is not None
+
+    def select_timeline(
+        self,
+        post_origin: str,
+        offset: int = 0,
+        limit: int = 20,
+        before: float = None,  # type: ignore
+    ) -> list:
+        """
+        Retrieve a page of non-deleted posts from a chat, newest page first.
+
+        The page is located on the (post_origin, isDeleted, creation_date)
+        index, so only the rowids of the page are looked up in the table.
+        Passing the creation_date of the oldest post already shown as
+        `before` continues from there without skipping `offset` rows.
+
+        Args:
+            post_origin (str): The chat the posts belong to.
+            offset (int): Number of newer posts to skip.
+            limit (int): Maximum number of posts to return.
+            before (float): Only return posts created before this timestamp.
+
+        Returns:
+            list: A list of tuples representing the posts, oldest first.
+        """
+        query = "SELECT rowid FROM posts WHERE post_origin = ? AND isDeleted = 0"
+        params = [post_origin]
+
+        if before is not None:
+            query += " AND creation_date < ?"
+            params.append(before)
+
+        query += " ORDER BY creation_date DESC LIMIT ? OFFSET ?"
+        params += [max(int(limit), 0), max(int(offset), 0)]
+
+        with self.lock:
+            self.cursor.execute(
+                f"SELECT * FROM posts WHERE rowid IN ({query}) ORDER BY creation_date ASC",
+                tuple(params),
+            )
+            return self.cursor.fetchall()
 
     def update_data(
         self,
@@ -129,13 +466,14 @@ class OceanDB:
             conditions_str = " AND ".join([f"{key} = ?" for key in conditions])
             query += f" WHERE {conditions_str}"
 
-        self.cursor.execute(
-            query,
-            tuple(update_data.values()) + tuple(conditions.values())
-            if conditions
-            else tuple(update_data.values()),
-        )
-        self.commit()
+        with self.lock:
+            self.cursor.execute(
+                query,
+                tuple(update_data.values()) + tuple(conditions.values())
+                if conditions
+                else tuple(update_data.values()),
+            )
+            self._written()
 
     def delete_data(self, table_name: str, conditions: dict = None) -> None:  # type: ignore
         """
@@ -151,12 +489,299 @@ class OceanDB:
             conditions_str = " AND ".join([f"{key} = ?" for key in conditions])
             query += f" WHERE {conditions_str}"
 
-        self.cursor.execute(query, tuple(conditions.values()) if conditions else ())
-        self.commit()
+        with self.lock:
+            self.cursor.execute(query, tuple(conditions.values()) if conditions else ())
+            self._written()
 
     def close(self) -> None:
         """
-        Close the database connection.
+        Close the database connection, committing pending writes first.
         """
+        self.flush()
         self.conn.close()
         Info(f"Closed database {self.db_name}")
+
+
+class AsyncOceanDB:
+    """
+    Awaitable OceanDB that keeps SQLite off the event loop.
+
+    Writes run in order on a single writer thread that owns a read-write
+    OceanDB. Reads run on a pool of threads, each with its own read-only
+    connection, so they can proceed in parallel thanks to WAL. While batched
+    writes are still uncommitted, reads go through the writer so callers
+    always see their own writes.
+
+    Args:
+        db_name (str): The name of the database.
+        readers (int): Number of read-only connections.
+        batch_size (int): Number of writes grouped into a single commit.
+        batch_interval (float): Maximum seconds a write waits for its commit.
+
+    Methods:
+        insert_data(table_name: str, values: tuple): Insert data into the specified table.
+        select_data(table_name: str, conditions: dict = None, columns: list = None, order_by: str = None, limit: int = None, as_rows: bool = False) -> list: Retrieve data from the specified table.
+        iter_data(table_name: str, conditions: dict = None, columns: list = None, order_by: str = None, batch_size: int = 1000, as_rows: bool = False): Stream rows from the specified table.
+        exists(table_name: str, conditions: dict = None) -> bool: Check if any row matches.
+        select_timeline(post_origin: str, offset: int = 0, limit: int = 20, before: float = None) -> list: Retrieve a page of posts from a chat.
+        update_data(table_name: str, update_data: dict, conditions: dict = None): Update data in the specified table.
+        delete_data(table_name: str, conditions: dict = None): Delete data from the specified table.
+        flush(): Commit all pending batched writes.
+        close(): Close all database connections.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        readers: int = 4,
+        batch_size: int = 1,
+        batch_interval: float = 0.05,
+    ) -> None:
+        """
+        Initialize the AsyncOceanDB instance.
+
+        Args:
+            db_name (str): The name of the database.
+            readers (int): Number of read-only connections.
+            batch_size (int): Number of writes grouped into a single commit.
+            batch_interval (float): Maximum seconds a write waits for its commit.
+        """
+        self.db_name = db_name
+        # Creating the writer first also creates the schema for the readers
+        self.writer = OceanDB(db_name, batch_size, batch_interval)
+        self.readers = []
+        self.local = threading.local()
+        self.write_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="oceandb-writer"
+        )
+        self.read_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(int(readers), 1), thread_name_prefix="oceandb-reader"
+        )
+
+    def _reader(self) -> OceanDB:
+        """
+        Get the read-only connection of the current reader thread.
+        """
+        if not hasattr(self.local, "db"):
+            self.local.db = OceanDB(self.db_name, read_only=True)
+            self.readers.append(self.local.db)
+        return self.local.db
+
+    async def _write(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.write_executor, getattr(self.writer, method), *args
+        )
+
+    async def _read(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        if self.writer.pending_writes:
+            return await self._write(method, *args)
+        return await loop.run_in_executor(
+            self.read_executor, lambda: getattr(self._reader(), method)(*args)
+        )
+
+    async def insert_data(self, table_name: str, values: tuple) -> None:
+        """
+        Insert data into the specified table.
+
+        Args:
+            table_name (str): The name of the table.
+            values (tuple): The values to be inserted.
+
+        Raises:
+            sqlite3.IntegrityError: If the row violates a unique index.
+        """
+        await self._write("insert_data", table_name, values)
+
+    async def select_data(
+        self,
+        table_name: str,
+        conditions: dict = None,  # type: ignore
+        columns: list = None,  # type: ignore
+        order_by: str = None,  # type: ignore
+        limit: int = None,  # type: ignore
+        as_rows: bool = False,
+    ) -> list:
+        """
+        Retrieve data from the specified table.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions to filter the results.
+            columns (list): The columns to select, all of them by default.
+            order_by (str): ORDER BY clause, e.g. "creation_date DESC".
+            limit (int): Maximum number of rows to return.
+            as_rows (bool): Return rows whose columns can be read by name.
+
+        Returns:
+            list: A list of tuples representing the selected data.
+        """
+        return await self._read(
+            "select_data", table_name, conditions, columns, order_by, limit, as_rows
+        )
+
+    async def iter_data(
+        self,
+        table_name: str,
+        conditions: dict = None,  # type: ignore
+        columns: list = None,  # type: ignore
+        order_by: str = None,  # type: ignore
+        batch_size: int = 1000,
+        as_rows: bool = False,
+    ):
+        """
+        Stream rows from the specified table, see OceanDB.iter_data.
+
+        Pending writes are committed first, then the rows are read on a
+        read-only connection of their own, one batch at a time on the
+        reader threads, so a long export never holds up the writer.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions to filter the results.
+            columns (list): The columns to select, all of them by default.
+            order_by (str): ORDER BY clause, e.g. "creation_date DESC".
+            batch_size (int): Number of rows fetched at a time.
+            as_rows (bool): Yield rows whose columns can be read by name.
+
+        Yields:
+            tuple: Each selected row.
+        """
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        batch_size = max(int(batch_size), 1)
+        reader = await loop.run_in_executor(
+            self.read_executor, lambda: OceanDB(self.db_name, read_only=True)
+        )
+        rows = reader.iter_data(
+            table_name, conditions, columns, order_by, batch_size, as_rows
+        )
+        try:
+            while True:
+                batch = await loop.run_in_executor(
+                    self.read_executor, lambda: list(itertools.islice(rows, batch_size))
+                )
+                for row in batch:
+                    yield row
+                if len(batch) < batch_size:
+                    return
+        finally:
+            rows.close()
+            reader.conn.close()
+
+    async def exists(self, table_name: str, conditions: dict = None) -> bool:  # type: ignore
+        """
+        Check if any row of the specified table matches the conditions.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions the row has to match.
+
+        Returns:
+            bool: True if a row matches, False otherwise.
+        """
+        return await self._read("exists", table_name, conditions)
+
+    async def select_timeline(
+        self,
+        post_origin: str,
+        offset: int = 0,
+        limit: int = 20,
+        before: float = None,  # type: ignore
+    ) -> list:
+        """
+        Retrieve a page of non-deleted posts from a chat, see OceanDB.select_timeline.
+
+        Args:
+            post_origin (str): The chat the posts belong to.
+            offset (int): Number of newer posts to skip.
+            limit (int): Maximum number of posts to return.
+            before (float): Only return posts created before this timestamp.
+
+        Returns:
+            list: A list of tuples representing the posts, oldest first.
+        """
+        return await self._read("select_timeline", post_origin, offset, limit, before)
+
+    async def update_data(
+        self,
+        table_name: str,
+        update_data: dict,
+        conditions: dict = None,  # type: ignore
+    ) -> None:
+        """
+        Update data in the specified table.
+
+        Args:
+            table_name (str): The name of the table.
+            update_data (dict): The data to be updated.
+            conditions (dict): Conditions to filter the update.
+        """
+        await self._write("update_data", table_name, update_data, conditions)
+
+    async def delete_data(self, table_name: str, conditions: dict = None) -> None:  # type: ignore
+        """
+        Delete data from the specified table.
+
+        Args:
+            table_name (str): The name of the table.
+            conditions (dict): Conditions to filter the deletion.
+        """
+        await self._write("delete_data", table_name, conditions)
+
+    async def flush(self) -> None:
+        """
+        Commit all pending batched writes.
+        """
+        await self._write("flush")
+
+    def close(self) -> None:
+        """
+        Wait for queued queries, then close all database connections.
+
+        This is synchronous so it can be called from signal handlers.
+        """
+        self.write_executor.shutdown(wait=True)
+        self.read_executor.shutdown(wait=True)
+        for reader in self.readers:
+            reader.conn.close()
+        self.writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a table as JSON lines")
+    parser.add_argument("table", help="the table to export, e.g. posts")
+    parser.add_argument("--db", default="db", help="name of the database")
+    parser.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        metavar="COLUMN=VALUE",
+        help="only rows where the column has this value, can be repeated",
+    )
+    parser.add_argument("--columns", help="comma separated columns to export")
+    parser.add_argument("--order-by", help='e.g. "creation_date DESC"')
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = OceanDB(args.db, read_only=True)
+    rows = db.iter_data(
+        args.table,
+        dict(condition.split("=", 1) for condition in args.where),
+        args.columns.split(",") if args.columns else None,
+        args.order_by,
+        args.batch_size,
+        as_rows=True,
+    )
+    try:
+        for row in rows:
+            print(
+                json.dumps(
+                    row._asdict(),
+                    default=lambda value: value.decode("utf-8", "replace"),
+                )
+            )
+    finally:
+        rows.close()
+        db.conn.close()
@@ -0,0 +1,81 @@
+import asyncio
+import concurrent.futures
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already waiting."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded thread pool.
+
+    A bcrypt call takes 100-300 ms of CPU, which would stall every other
+    client if it ran on the event loop. bcrypt releases the GIL while it
+    works, so a thread pool of `workers` threads hashes that many passwords
+    in parallel. At most max_pending hashes can be running or queued;
+    beyond that new ones are rejected with PasswordHasherBusy right away
+    instead of piling up behind a login storm.
+
+    Args:
+        workers (int): Number of hashes running at once.
+        max_pending (int): Maximum number of hashes running or queued.
+        rounds (int): bcrypt cost factor of new hashes.
+
+    Attributes:
+        stats (dict): Counters for hashed and checked passwords and rejections.
+
+    Methods:
+        hash(password: str) -> bytes: Hash a new password.
+        check(password: str, hashed: bytes) -> bool: Verify a password.
+        close(): Stop the worker threads.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, rounds: int = 12):
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.stats = {"hashed": 0, "checked": 0, "rejected": 0}
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+
+    async def _run(self, function, *args):
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise PasswordHasherBusy(f"{self.pending} password hashes are pending")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, function, *args
+            )
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> bytes:
+        """
+        Hash a new password with a fresh salt.
+
+        Raises:
+            PasswordHasherBusy: If max_pending hashes are already pending.
+        """
+        salt = bcrypt.gensalt(self.rounds)
+        hashed = await self._run(bcrypt.hashpw, bytes(password, "utf-8"), salt)
+        self.stats["hashed"] += 1
+        return hashed
+
+    async def check(self, password: str, hashed: bytes) -> bool:
+        """
+        Check a password against its stored hash.
+
+        Raises:
+            PasswordHasherBusy: If max_pending hashes are already pending.
+        """
+        valid = await self._run(bcrypt.checkpw, bytes(password, "utf-8"), hashed)
+        self.stats["checked"] += 1
+        return valid
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,77 @@
+from better_profanity import Profanity
+
+
+class CompiledWordSet:
+    """
+    Censor word set compiled into a character trie.
+
+    better_profanity keeps its words as a list of VaryingString objects and
+    tests membership by comparing the text against every one of them. This
+    answers the same question by walking a trie once: a text character can
+    follow the edge of any censor character it may stand for according to
+    the character mapping (e.g. "@" for "a" or "o").
+
+    Args:
+        words (list): The lowercase censor words.
+        char_map (dict): Maps characters to the characters that may replace them.
+    """
+
+    def __init__(self, words, char_map):
+        self.char_map = char_map
+        # Text character -> censor characters it can stand for
+        self.substitutes = {}
+        for char, replacements in char_map.items():
+            for replacement in replacements:
+                self.substitutes.setdefault(replacement, set()).add(char)
+        self.trie = {}
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        node = self.trie
+        for char in word:
+            node = node.setdefault(char, {})
+        if None not in node:
+            node[None] = True
+            self.size += 1
+
+    def append(self, word):
+        # better_profanity appends VaryingString objects in add_censor_words
+        self.add(str(word).lower())
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, text):
+        if not isinstance(text, str):
+            return False
+        nodes = [self.trie]
+        for char in text:
+            candidates = self.substitutes.get(char, ())
+            next_nodes = []
+            for node in nodes:
+                if char in node:
+                    next_nodes.append(node[char])
+                for candidate in candidates:
+                    if candidate != char and candidate in node:
+                        next_nodes.append(node[candidate])
+            if not next_nodes:
+                return False
+            nodes = next_nodes
+        return any(None in node for node in nodes)
+
+
+class ProfanityFilter(Profanity):
+    """
+    better_profanity's Profanity with its word set compiled into a trie.
+
+    Tokenization, multi-word matching and replacement are inherited
+    unchanged, so censor() gives the same output, only faster.
+    """
+
+    def _populate_words_to_wordset(self, words, **kwargs):
+        super()._populate_words_to_wordset(words, **kwargs)
+        self.CENSOR_WORDSET = CompiledWordSet(
+            [str(word) for word in self.CENSOR_WORDSET], self.CHARS_MAPPING
+        )
@@ -1,6 +1,10 @@
 from flask import Flask, request
+import requests
 import subprocess
 
+# Where main.py serves its metrics, see SETTINGS["metrics_port"]
+METRICS_URL = "http://127.0.0.1:4001/metrics"
+
 app = Flask("app")
 server_process = None
 
@@ -14,6 +18,19 @@ def index():
     return "Pong!", 200
 
 
+@app.route("/metrics")
+def metrics():
+    try:
+        response = requests.get(METRICS_URL, timeout=2)
+    except requests.RequestException:
+        return "Server metrics unavailable", 503
+    return (
+        response.text,
+        response.status_code,
+        {"Content-Type": response.headers.get("Content-Type", "text/plain")},
+    )
+
+
 @app.post("/gh-push")
 def github_push():
     global server_process
@@ -0,0 +1,120 @@
+import time
+import uuid
+
+import jwt
+
+
+class InvalidSessionToken(Exception):
+    """Raised when a session token is malformed, forged, expired or revoked."""
+
+
+class SessionTokens:
+    """
+    Issues and verifies the HS256 tokens that let clients resume a session.
+
+    Checking a password takes a full bcrypt hash, so a deploy that
+    reconnects every client at once would queue thousands of them. auth
+    hands out a token instead, and the token command logs back in by
+    checking its signature, which takes microseconds. Tokens expire after
+    ttl seconds. Each carries a unique id (jti), and revoking one adds its
+    id to a revocation list that is kept until the token would have
+    expired anyway.
+
+    Without a key of at least MIN_KEY_BYTES, anyone could sign tokens, so
+    tokens are disabled: issue() returns None and verify() rejects all.
+
+    Args:
+        key (str): The HS256 signing key, None if there is none.
+        ttl (float): Seconds a token stays valid.
+
+    Attributes:
+        enabled (bool): Whether the key is strong enough to use tokens.
+        revoked (dict): Ids of revoked tokens -> when the token expires.
+
+    Methods:
+        issue(username: str) -> str: Create a token for a user.
+        verify(token: str) -> dict: Check a token and return its claims.
+        revoke(claims: dict): Revoke a verified token.
+        load(db: OceanDB): Restore saved revocations and delete expired ones.
+    """
+
+    ALGORITHM = "HS256"
+    CLAIMS = ["username", "iat", "exp", "jti"]
+    MIN_KEY_BYTES = 32
+
+    def __init__(self, key: str, ttl: float = 7 * 24 * 60 * 60):
+        self.key = key
+        self.ttl = ttl
+        self.enabled = (
+            key is not None and len(key.encode("utf-8")) >= self.MIN_KEY_BYTES
+        )
+        self.revoked = {}
+
+    def issue(self, username: str) -> str:
+        if not self.enabled:
+            return None  # type: ignore
+        now = int(time.time())
+        return jwt.encode(
+            {
+                "username": username,
+                "iat": now,
+                "exp": now + int(self.ttl),
+                "jti": uuid.uuid4().hex,
+            },
+            self.key,
+            algorithm=self.ALGORITHM,
+        )
+
+    def verify(self, token: str) -> dict:
+        """
+        Check a token's signature, expiry and revocation.
+
+        Returns:
+            dict: The token's claims.
+
+        Raises:
+            InvalidSessionToken: If the token can't be used to log in.
+        """
+        if not self.enabled:
+            raise InvalidSessionToken("Session tokens are disabled")
+        try:
+            claims = jwt.decode(
+                token,
+                self.key,
+                algorithms=[self.ALGORITHM],
+                options={"require": self.CLAIMS},
+            )
+        except jwt.InvalidTokenError as e:
+            raise InvalidSessionToken(str(e)) from None
+        if claims["jti"] in self.revoked:
+            raise InvalidSessionToken("Token has been revoked")
+        return claims
+
+    def revoke(self, claims: dict) -> None:
+        """
+        Revoke a token, given the claims verify() returned for it.
+        """
+        now = time.time()
+        # Expired tokens fail verification anyway
+        for jti, expires in list(self.revoked.items()):
+            if expires <= now:
+                del self.revoked[jti]
+        self.revoked[claims["jti"]] = claims["exp"]
+
+    def load(self, db) -> None:
+        """
+        Restore revocations from the revoked_tokens table.
+
+        Rows of tokens that have expired since are deleted, so the table
+        only holds revocations that still matter.
+
+        Args:
+            db (OceanDB): The database, before the server starts using it.
+        """
+        now = time.time()
+        for jti, expires in db.select_data("revoked_tokens"):
+            if expires > now:
+                self.revoked[jti] = expires
+            else:
+                db.delete_data("revoked_tokens", {"jti": jti})
+        db.flush()
@@ -0,0 +1,71 @@
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Import the server's modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """
+    Local HTTP server that records requests and answers with a handler.
+
+    Attributes:
+        url (str): Base URL of the server, ending in a slash.
+        requests (list): (time, path, body) of every request, in order.
+        handler (callable): Called with (path, body) and returns
+            (status, body). body may be bytes or anything JSON can encode.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+        self.handler = lambda path, body: (200, b"")
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), self.path, body))
+                status, reply = stub.handler(self.path, body)
+                if not isinstance(reply, bytes):
+                    reply = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+        self.thread.start()
+
+    def wait_for(self, count, timeout=5):
+        """Wait until count requests have arrived."""
+        deadline = time.monotonic() + timeout
+        while len(self.requests) < count:
+            assert time.monotonic() < deadline, f"got {len(self.requests)} requests"
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
@@ -0,0 +1,87 @@
+import threading
+
+from bridge import BridgeDispatcher
+
+
+def test_retries_with_backoff(stub_server):
+    replies = iter([503, 429, 200])
+    stub_server.handler = lambda path, body: (next(replies), b"")
+    bridge = BridgeDispatcher(stub_server.url, retries=3, backoff=0.1)
+
+    assert bridge.submit("hello")
+    bridge.close()
+
+    assert [path for _, path, _ in stub_server.requests] == ["/hello"] * 3
+    times = [at for at, _, _ in stub_server.requests]
+    assert times[1] - times[0] >= 0.1
+    assert times[2] - times[1] >= 0.2
+    assert bridge.stats == {
+        "queued": 1,
+        "sent": 1,
+        "failed": 0,
+        "retried": 2,
+        "dropped": 0,
+    }
+
+
+def test_gives_up_after_retries(stub_server):
+    stub_server.handler = lambda path, body: (500, b"")
+    bridge = BridgeDispatcher(stub_server.url, retries=2, backoff=0.01)
+
+    bridge.submit("hello")
+    bridge.close()
+
+    assert len(stub_server.requests) == 3
+    assert bridge.stats["failed"] == 1
+    assert bridge.stats["retried"] == 2
+
+
+def test_client_errors_are_not_retried(stub_server):
+    stub_server.handler = lambda path, body: (404, b"")
+    bridge = BridgeDispatcher(stub_server.url, retries=3, backoff=0.01)
+
+    bridge.submit("hello")
+    bridge.close()
+
+    assert len(stub_server.requests) == 1
+    assert bridge.stats["failed"] == 1
+    assert bridge.stats["retried"] == 0
+
+
+def test_drops_when_queue_is_full(stub_server):
+    release = threading.Event()
+
+    def handler(path, body):
+        release.wait(5)
+        return 200, b""
+
+    stub_server.handler = handler
+    bridge = BridgeDispatcher(stub_server.url, max_queue=2, batch_size=1, workers=1)
+
+    # The worker takes the first post and waits on the server
+    assert bridge.submit("0")
+    stub_server.wait_for(1)
+    assert bridge.submit("1")
+    assert bridge.submit("2")
+    assert not bridge.submit("3")
+    assert bridge.stats["dropped"] == 1
+
+    release.set()
+    bridge.close()
+    assert sorted(path for _, path, _ in stub_server.requests) == ["/0", "/1", "/2"]
+    assert bridge.stats["sent"] == 3
+
+
+def test_close_drains_and_joins(stub_server):
+    bridge = BridgeDispatcher(stub_server.url, batch_size=4, workers=2)
+
+    for i in range(20):
+        assert bridge.submit(str(i))
+    bridge.close()
+
+    assert not bridge.thread.is_alive()
+    assert len(stub_server.requests) == 20
+    assert bridge.stats["sent"] == 20
+    # Posts submitted after closing are dropped
+    assert not bridge.submit("late")
+    assert bridge.stats["dropped"] == 1
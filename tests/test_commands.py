@@ -0,0 +1,40 @@
+import pytest
+
+from commands import (
+    MAX_OFFSET,
+    PayloadError,
+    PostSend,
+    RetrieveLatest,
+    compile_payload,
+    parse_payload,
+)
+
+
+def parse(payload, data):
+    return parse_payload(payload, compile_payload(payload), data)
+
+
+def test_converts_and_fills_defaults():
+    assert parse(RetrieveLatest, {"c": "home", "o": "3"}) == RetrieveLatest("home", 3)
+    assert parse(PostSend, {"p": 12}) == PostSend("12", "", "home")
+
+
+@pytest.mark.parametrize(
+    "data, error",
+    [
+        ("home", "expected an object"),
+        ({}, "missing c"),
+        ({"c": "home", "o": "x"}, "o must be of type int"),
+        ({"c": "home", "o": -1}, f"o must be between 0 and {MAX_OFFSET}"),
+        # Too large for SQLite's OFFSET
+        ({"c": "home", "o": 2**64}, f"o must be between 0 and {MAX_OFFSET}"),
+    ],
+)
+def test_rejects_invalid_payloads(data, error):
+    with pytest.raises(PayloadError, match=error):
+        parse(RetrieveLatest, data)
+
+
+def test_accepts_offsets_in_range():
+    assert parse(RetrieveLatest, {"c": "home", "o": MAX_OFFSET}).o == MAX_OFFSET
+    assert parse(RetrieveLatest, {"c": "home", "o": 0.0}).o == 0
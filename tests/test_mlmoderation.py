@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+
+from mlmoderation import MLModerationClient
+
+
+def classify(path, body):
+    """Score texts containing "bad" as toxic, like the inference API."""
+    return 200, [
+        [
+            {"label": "toxic", "score": 0.9 if "bad" in text else 0.1},
+            {"label": "neutral", "score": 0.1 if "bad" in text else 0.9},
+        ]
+        for text in json.loads(body)["inputs"]
+    ]
+
+
+def inputs(stub_server):
+    return [json.loads(body)["inputs"] for _, _, body in stub_server.requests]
+
+
+def test_batches_concurrent_texts(stub_server):
+    stub_server.handler = classify
+    client = MLModerationClient(stub_server.url, batch_size=3, batch_window=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            *(client.is_allowed(text) for text in ["a", "bad b", "c", "d", "bad e"])
+        )
+
+    assert asyncio.run(run()) == [True, False, True, True, False]
+    assert inputs(stub_server) == [["a", "bad b", "c"], ["d", "bad e"]]
+    assert client.stats["calls"] == 2
+    client.close()
+
+
+def test_cache_hits(stub_server):
+    stub_server.handler = classify
+    client = MLModerationClient(stub_server.url)
+
+    async def run():
+        return [await client.is_allowed(text) for text in ["bad", "good", "bad"]]
+
+    assert asyncio.run(run()) == [False, True, False]
+    assert inputs(stub_server) == [["bad"], ["good"]]
+    assert client.stats["hits"] == 1
+    assert client.stats["misses"] == 2
+    client.close()
+
+
+def test_duplicates_share_pending_and_in_flight_calls(stub_server):
+    release = threading.Event()
+
+    def handler(path, body):
+        release.wait(5)
+        return classify(path, body)
+
+    stub_server.handler = handler
+    client = MLModerationClient(stub_server.url, batch_window=0.01)
+
+    async def run():
+        # Two copies in the same batch
+        first = asyncio.gather(client.is_allowed("bad"), client.is_allowed("bad"))
+        await asyncio.to_thread(stub_server.wait_for, 1)
+        # A third copy while the batch is being classified
+        third = asyncio.ensure_future(client.is_allowed("bad"))
+        await asyncio.sleep(0.1)
+        release.set()
+        return [*await first, await third]
+
+    assert asyncio.run(run()) == [False, False, False]
+    assert inputs(stub_server) == [["bad"]]
+    assert client.futures == {}
+    client.close()
+
+
+def test_timeout_fails_closed(stub_server):
+    def handler(path, body):
+        time.sleep(0.5)
+        return classify(path, body)
+
+    stub_server.handler = handler
+    client = MLModerationClient(stub_server.url, timeout=0.1)
+
+    assert asyncio.run(client.is_allowed("good")) is False
+    assert client.stats["failures"] == 1
+    # Failures are not cached
+    assert client.cache == {}
+    client.close()
+
+
+def test_timeout_fails_open(stub_server):
+    def handler(path, body):
+        time.sleep(0.5)
+        return classify(path, body)
+
+    stub_server.handler = handler
+    client = MLModerationClient(stub_server.url, timeout=0.1, fail_open=True)
+
+    assert asyncio.run(client.is_allowed("bad")) is True
+    assert client.stats["failures"] == 1
+    client.close()
+
+
+def test_server_errors_fail_closed_then_recover(stub_server):
+    replies = iter([(500, b"overloaded"), None])
+
+    def handler(path, body):
+        reply = next(replies)
+        return reply or classify(path, body)
+
+    stub_server.handler = handler
+    client = MLModerationClient(stub_server.url)
+
+    async def run():
+        return [await client.is_allowed("good") for _ in range(2)]
+
+    assert asyncio.run(run()) == [False, True]
+    assert len(stub_server.requests) == 2
+    client.close()
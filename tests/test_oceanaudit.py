@@ -0,0 +1,51 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent(
+    """
+    import os, signal, sys, time
+    sys.path.insert(0, {root!r})
+    from oceanaudit import OceanAuditLogger
+
+    audit = OceanAuditLogger({log!r}, buffered=True, flush_interval=60)
+    for i in range(100):
+        audit.log_action("post", "someone", str(i))
+    os.kill(os.getpid(), signal.SIGTERM)
+    time.sleep(5)
+    """
+)
+
+
+def test_sigterm_writes_queued_entries(tmp_path):
+    log = str(tmp_path / "audit.log")
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(root=ROOT, log=log)], timeout=10
+    )
+
+    # The signal still terminates the process
+    assert result.returncode == -signal.SIGTERM
+    with open(log) as log_file:
+        assert len(log_file.readlines()) == 100
+
+
+def test_rotation_keeps_every_file_under_max_bytes(tmp_path):
+    from oceanaudit import OceanAuditLogger
+
+    log = str(tmp_path / "audit.log")
+    audit = OceanAuditLogger(log, buffered=True, flush_size=512, max_bytes=4096)
+    for i in range(2000):
+        audit.log_action("post", "someone", f"entry {i}")
+    audit.close()
+
+    segments = audit.read_manifest()
+    assert len(segments) > 1
+    assert all(segment["bytes"] <= 4096 for segment in segments)
+    assert os.path.getsize(log) <= 4096
+    assert (
+        sum(segment["entries"] for segment in segments) + audit.active_entries == 2000
+    )
@@ -0,0 +1,47 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from oceandb import OceanDB
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # OceanDB reads db.json from the working directory
+    monkeypatch.chdir(ROOT)
+    db = OceanDB(str(tmp_path / "test"))
+    yield db
+    db.close()
+
+
+def indexes(db, table):
+    return {
+        row[1]: bool(row[2]) for row in db.conn.execute(f"PRAGMA index_list({table})")
+    }
+
+
+def test_failed_unique_rebuild_keeps_old_index(db):
+    with open(os.path.join(ROOT, "db.json")) as f:
+        schema = json.load(f)["users"]
+    db.conn.execute("DROP INDEX idx_users_username")
+    db.conn.execute("CREATE INDEX idx_users_username ON users (username)")
+    columns = len(db.conn.execute("PRAGMA table_info(users)").fetchall())
+    for _ in range(2):
+        db.insert_data("users", ("dup",) + (None,) * (columns - 1))
+    db.flush()
+
+    db.sync_indexes("users", schema)
+    assert indexes(db, "users")["idx_users_username"] is False
+    assert not db.conn.in_transaction
+
+
+def test_other_errors_roll_back(db):
+    schema = {"_indexes": {"idx_posts_bad": ["no_such_column"]}}
+    with pytest.raises(sqlite3.OperationalError):
+        db.sync_indexes("posts", schema)
+    assert not db.conn.in_transaction
+    assert "idx_posts_bad" not in indexes(db, "posts")
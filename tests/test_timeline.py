@@ -0,0 +1,35 @@
+import asyncio
+
+from timeline import CHAT_OVERHEAD, TimelineCache
+
+
+class StubDB:
+    """Returns no posts for every chat, like a database of unknown chat ids."""
+
+    async def select_timeline(self, post_origin, offset, limit, before=None):
+        return []
+
+
+def test_empty_chats_count_towards_max_bytes():
+    cache = TimelineCache(StubDB(), max_bytes=10000)
+
+    async def run():
+        for i in range(1000):
+            await cache.select_timeline(f"{i:04d}" + "x" * 1000)
+
+    asyncio.run(run())
+    assert 0 < cache.bytes <= 10000
+    assert len(cache.chats) == 10000 // (CHAT_OVERHEAD + 1004)
+    assert cache.stats["evictions"] == 1000 - len(cache.chats)
+
+
+def test_max_chats():
+    cache = TimelineCache(StubDB(), max_chats=50)
+
+    async def run():
+        for i in range(200):
+            await cache.select_timeline(str(i))
+
+    asyncio.run(run())
+    assert list(cache.chats) == [str(i) for i in range(150, 200)]
+    assert cache.stats["evictions"] == 150
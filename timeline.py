@@ -0,0 +1,234 @@
+import bisect
+import collections
+import operator
+
+# Columns of the posts table, in the order of db.json
+COLUMNS = (
+    "author",
+    "creation_date",
+    "uid",
+    "content",
+    "isDeleted",
+    "post_origin",
+    "type",
+    "attachment",
+    "edited_at",
+)
+CREATION_DATE = COLUMNS.index("creation_date")
+UID = COLUMNS.index("uid")
+POST_ORIGIN = COLUMNS.index("post_origin")
+
+# Rough bytes a cached post takes besides its text
+POST_OVERHEAD = 300
+# Rough bytes a cached chat takes besides its id and posts
+CHAT_OVERHEAD = 400
+
+_creation_date = operator.itemgetter(CREATION_DATE)
+
+
+def _size(post: tuple) -> int:
+    return POST_OVERHEAD + sum(len(value) for value in post if isinstance(value, str))
+
+
+class _Chat:
+    """The newest posts of one chat, oldest first."""
+
+    __slots__ = ("posts", "complete", "size")
+
+    def __init__(self, post_origin: str, posts: list, complete: bool):
+        self.posts = posts
+        # Whether the chat has no posts older than the cached ones
+        self.complete = complete
+        # Empty chats still cost their entry, so they count towards max_bytes
+        self.size = (
+            CHAT_OVERHEAD + len(post_origin) + sum(_size(post) for post in posts)
+        )
+
+    def page(self, offset: int, limit: int, before: float = None):  # type: ignore
+        """The same page as OceanDB.select_timeline, or None if it isn't cached."""
+        posts = self.posts
+        end = len(posts)
+        if before is not None:
+            end = bisect.bisect_left(posts, before, key=_creation_date)
+        end -= offset
+        start = end - limit
+        if start < 0 and not self.complete:
+            return None
+        return posts[max(start, 0) : max(end, 0)]
+
+
+class TimelineCache:
+    """
+    Keeps the newest posts of recently read chats in memory.
+
+    retrieve latest asks for the newest pages of a chat over and over, and
+    a chat only changes when a post in it is sent, edited or deleted. The
+    first read of a chat loads its newest per_chat posts; after that pages
+    within them are served from memory, and only deeper pages still go to
+    the database. The post handlers write every change through to the
+    cache right after writing it to the database, so cached pages are never
+    stale. When the cached chats take more than about max_bytes, or there
+    are more than max_chats of them, the least recently read chats are
+    dropped. Every chat is charged for its entry as well as its posts, so
+    reading many empty chats can't get around the cap.
+
+    Args:
+        db (AsyncOceanDB): The database the posts are loaded from.
+        per_chat (int): Number of newest posts cached per chat.
+        max_bytes (int): Approximate memory cap of all cached chats.
+        max_chats (int): Maximum number of cached chats.
+
+    Attributes:
+        stats (dict): Counters for reads served from memory (hits) and the
+            database (misses), and for chats dropped to stay under the caps.
+
+    Methods:
+        select_timeline(post_origin: str, offset: int = 0, limit: int = 20, before: float = None) -> list: Retrieve a page of posts from a chat.
+        insert(post: tuple): Add a post that was just inserted.
+        update(post_origin: str, uid: str, changes: dict): Change a cached post.
+        remove(post_origin: str, uid: str): Drop a post that was just deleted.
+    """
+
+    def __init__(
+        self,
+        db,
+        per_chat: int = 100,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_chats: int = 10000,
+    ):
+        self.db = db
+        self.per_chat = max(int(per_chat), 1)
+        self.max_bytes = max_bytes
+        self.max_chats = max_chats
+        # Chat -> _Chat, least recently read first
+        self.chats = collections.OrderedDict()
+        self.bytes = 0
+        # Chats being loaded -> whether they changed while loading
+        self.loading = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    async def select_timeline(
+        self,
+        post_origin: str,
+        offset: int = 0,
+        limit: int = 20,
+        before: float = None,  # type: ignore
+    ) -> list:
+        """
+        Retrieve a page of non-deleted posts from a chat, see OceanDB.select_timeline.
+
+        Args:
+            post_origin (str): The chat the posts belong to.
+            offset (int): Number of newer posts to skip.
+            limit (int): Maximum number of posts to return.
+            before (float): Only return posts created before this timestamp.
+
+        Returns:
+            list: A list of tuples representing the posts, oldest first.
+        """
+        offset = max(int(offset), 0)
+        limit = max(int(limit), 0)
+        chat = self.chats.get(post_origin)
+        if chat is None and post_origin not in self.loading:
+            chat = await self._load(post_origin)
+        elif chat is not None:
+            self.chats.move_to_end(post_origin)
+
+        page = chat.page(offset, limit, before) if chat is not None else None
+        if page is None:
+            self.stats["misses"] += 1
+            return await self.db.select_timeline(post_origin, offset, limit, before)
+        self.stats["hits"] += 1
+        return page
+
+    async def _load(self, post_origin: str) -> _Chat:
+        self.loading[post_origin] = False
+        try:
+            posts = await self.db.select_timeline(post_origin, 0, self.per_chat)
+        finally:
+            changed = self.loading.pop(post_origin)
+        chat = _Chat(post_origin, posts, complete=len(posts) < self.per_chat)
+        # A post written during the load may be missing from it, so keep
+        # the posts for this read only
+        if not changed:
+            self.chats[post_origin] = chat
+            self.bytes += chat.size
+            self._evict()
+        return chat
+
+    def _evict(self) -> None:
+        while self.chats and (
+            self.bytes > self.max_bytes or len(self.chats) > self.max_chats
+        ):
+            _, chat = self.chats.popitem(last=False)
+            self.bytes -= chat.size
+            self.stats["evictions"] += 1
+
+    def _changed(self, post_origin: str):
+        if post_origin in self.loading:
+            self.loading[post_origin] = True
+        return self.chats.get(post_origin)
+
+    def _resize(self, chat: _Chat, delta: int) -> None:
+        chat.size += delta
+        self.bytes += delta
+
+    def insert(self, post: tuple) -> None:
+        """
+        Add a post to its chat after it was inserted into the database.
+
+        Args:
+            post (tuple): The inserted values, in the order of COLUMNS.
+        """
+        # SQLite returns booleans as integers
+        post = tuple(int(value) if value.__class__ is bool else value for value in post)
+        chat = self._changed(post[POST_ORIGIN])
+        if chat is None:
+            return
+        bisect.insort(chat.posts, post, key=_creation_date)
+        self._resize(chat, _size(post))
+        if len(chat.posts) > self.per_chat:
+            self._resize(chat, -_size(chat.posts.pop(0)))
+            chat.complete = False
+        self._evict()
+
+    def update(self, post_origin: str, uid: str, changes: dict) -> None:
+        """
+        Change a cached post after it was updated in the database.
+
+        Args:
+            post_origin (str): The chat the post belongs to.
+            uid (str): The post's uid.
+            changes (dict): The updated columns and their new values.
+        """
+        chat = self._changed(post_origin)
+        if chat is None:
+            return
+        posts = chat.posts
+        for index in range(len(posts) - 1, -1, -1):
+            if posts[index][UID] == uid:
+                post = list(posts[index])
+                for column, value in changes.items():
+                    post[COLUMNS.index(column)] = value
+                post = tuple(post)
+                self._resize(chat, _size(post) - _size(posts[index]))
+                posts[index] = post
+                self._evict()
+                return
+
+    def remove(self, post_origin: str, uid: str) -> None:
+        """
+        Drop a post from its chat after it was deleted in the database.
+
+        Args:
+            post_origin (str): The chat the post belongs to.
+            uid (str): The post's uid.
+        """
+        chat = self._changed(post_origin)
+        if chat is None:
+            return
+        posts = chat.posts
+        for index in range(len(posts) - 1, -1, -1):
+            if posts[index][UID] == uid:
+                self._resize(chat, -_size(posts.pop(index)))
+                return
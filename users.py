@@ -0,0 +1,123 @@
+import collections
+import time
+
+# Columns of the users table that are cached
+COLUMNS = ["username", "uuid", "banned", "password"]
+
+
+class UserCache:
+    """
+    Caches user records, and usernames that have no record, in front of the database.
+
+    auth and genaccount look the client's username up on every attempt,
+    so a client retrying a password or probing usernames costs a database
+    read each time. Records that exist are kept in an LRU of max_users
+    entries; usernames without a record are kept in a separate LRU of
+    max_missing entries, so a storm of made-up names can't push real
+    users out. Entries expire after ttl or missing_ttl seconds, which
+    bounds how long edits made outside the server (e.g. with dber.py) go
+    unnoticed. The server calls invalidate() whenever it changes a user.
+    Only the COLUMNS logging in needs are loaded.
+
+    Args:
+        db (AsyncOceanDB): The database the users are loaded from.
+        max_users (int): Maximum number of cached records.
+        max_missing (int): Maximum number of cached unknown usernames.
+        ttl (float): Seconds a record stays cached.
+        missing_ttl (float): Seconds an unknown username stays cached.
+
+    Attributes:
+        stats (dict): Counters for lookups served from memory (hits and
+            missing_hits), from the database (misses) and for evictions.
+
+    Methods:
+        get(username: str) -> tuple: The user's row, or None if there is none.
+        invalidate(username: str): Forget what is cached about a user.
+    """
+
+    def __init__(
+        self,
+        db,
+        max_users: int = 10000,
+        max_missing: int = 10000,
+        ttl: float = 300,
+        missing_ttl: float = 30,
+    ):
+        self.db = db
+        self.max_users = max_users
+        self.max_missing = max_missing
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        # Username -> (expiry, row), least recently used first
+        self.users = collections.OrderedDict()
+        # Username -> expiry, least recently used first
+        self.missing = collections.OrderedDict()
+        # Usernames being loaded -> whether they changed while loading
+        self.loading = {}
+        self.stats = {"hits": 0, "missing_hits": 0, "misses": 0, "evictions": 0}
+
+    async def get(self, username: str):
+        """
+        Look a user up by username.
+
+        Returns:
+            tuple: The user's COLUMNS as a row from OceanDB, or None if there is none.
+        """
+        now = time.monotonic()
+        entry = self.users.get(username)
+        if entry is not None:
+            if entry[0] > now:
+                self.users.move_to_end(username)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self.users[username]
+        expiry = self.missing.get(username)
+        if expiry is not None:
+            if expiry > now:
+                self.missing.move_to_end(username)
+                self.stats["missing_hits"] += 1
+                return None
+            del self.missing[username]
+
+        self.stats["misses"] += 1
+        if username in self.loading:
+            # Someone else is loading it, don't cache a second copy
+            selection = await self.db.select_data(
+                "users", {"username": username}, COLUMNS, limit=1, as_rows=True
+            )
+            return selection[0] if selection else None
+
+        self.loading[username] = False
+        try:
+            selection = await self.db.select_data(
+                "users", {"username": username}, COLUMNS, limit=1, as_rows=True
+            )
+        finally:
+            changed = self.loading.pop(username)
+        row = selection[0] if selection else None
+        if not changed:
+            self._store(username, row, now)
+        return row
+
+    def _store(self, username: str, row, now: float) -> None:
+        if row is None:
+            cache, limit = self.missing, self.max_missing
+            cache[username] = now + self.missing_ttl
+        else:
+            cache, limit = self.users, self.max_users
+            cache[username] = (now + self.ttl, row)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, username: str) -> None:
+        """
+        Forget a user after creating or changing their record.
+
+        Args:
+            username (str): The user's username.
+        """
+        self.users.pop(username, None)
+        self.missing.pop(username, None)
+        if username in self.loading:
+            self.loading[username] = True
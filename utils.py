@@ -1,50 +1,259 @@
 import time
-from oceanaudit import OceanAuditLogger
 from logs import Critical, Debug, Error, Info, Warning  # noqa: F401
-from better_profanity import profanity
-import requests
+from profanityfilter import ProfanityFilter
+from mlmoderation import MLModerationClient
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 HF_TOKEN: str = os.getenv("HF_TOKEN")  # type: ignore
 
-# Instantiate the OceanAuditLogger object
-audit = OceanAuditLogger()
+
+class TokenBucket:
+    __slots__ = ("tokens", "last_update")
+
+    def __init__(self, tokens, last_update):
+        self.tokens = tokens
+        self.last_update = last_update
 
 
 class WebSocketRateLimiter:
-    def __init__(self, rate_limit, time_interval):
+    """
+    Token bucket rate limiter keyed by client id.
+
+    Buckets live in shards. Every sweep_every calls one shard is swept and
+    its buckets that have been idle long enough to refill completely are
+    dropped, which changes nothing for their clients since a new bucket
+    starts full. remove() drops a bucket right away, e.g. on disconnect.
+    """
+
+    def __init__(self, rate_limit, time_interval, shards=64, sweep_every=256):
         self.rate_limit = rate_limit
         self.time_interval = time_interval
-        self.client_buckets = {}
+        self.refill_rate = rate_limit / time_interval
+        self.shards = [{} for _ in range(shards)]
+        self.sweep_every = sweep_every
+        self.calls = 0
+        self.next_shard = 0
 
-    async def acquire(self, client_id):
-        if client_id not in self.client_buckets:
-            self.client_buckets[client_id] = {
-                "tokens": self.rate_limit,
-                "last_update": time.time(),
-            }
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
 
-        client_bucket = self.client_buckets[client_id]
-        now = time.time()
-        elapsed_time = now - client_bucket["last_update"]
+    def _shard(self, client_id):
+        return self.shards[hash(client_id) % len(self.shards)]
+
+    def _bucket(self, client_id, now):
+        """Return the client's bucket, refilled up to now."""
+        shard = self._shard(client_id)
+        client_bucket = shard.get(client_id)
+        if client_bucket is None:
+            client_bucket = shard[client_id] = TokenBucket(self.rate_limit, now)
+            return client_bucket
 
         # Refill tokens based on the elapsed time
-        client_bucket["tokens"] += elapsed_time * (self.rate_limit / self.time_interval)
-        client_bucket["tokens"] = min(client_bucket["tokens"], self.rate_limit)
-        client_bucket["last_update"] = now
+        client_bucket.tokens = min(
+            client_bucket.tokens + (now - client_bucket.last_update) * self.refill_rate,
+            self.rate_limit,
+        )
+        client_bucket.last_update = now
+        return client_bucket
+
+    def _tick(self, now):
+        self.calls += 1
+        if self.calls % self.sweep_every == 0:
+            self.sweep(now)
+
+    async def acquire(self, client_id, cost=1):
+        now = time.monotonic()
+        self._tick(now)
+        client_bucket = self._bucket(client_id, now)
 
         # Check if there are enough tokens
-        if client_bucket["tokens"] >= 1:
-            client_bucket["tokens"] -= 1
+        if client_bucket.tokens >= cost:
+            client_bucket.tokens -= cost
             return True
         else:
             return False
 
+    def remove(self, client_id):
+        self._shard(client_id).pop(client_id, None)
+
+    def sweep(self, now=None):
+        """Drop the idle buckets of the next shard."""
+        now = time.monotonic() if now is None else now
+        shard = self.shards[self.next_shard]
+        self.next_shard = (self.next_shard + 1) % len(self.shards)
+        idle = [
+            client_id
+            for client_id, client_bucket in shard.items()
+            if client_bucket.tokens
+            + (now - client_bucket.last_update) * self.refill_rate
+            >= self.rate_limit
+        ]
+        for client_id in idle:
+            del shard[client_id]
+
+
+class RateLimitPolicy:
+    """
+    Rate limits direct commands per client, per logged-in user and per IP.
+
+    Every command costs a number of tokens (1 unless listed in costs) and
+    is only allowed if the client, user and IP buckets can all pay for
+    it, so reconnecting doesn't reset a user's or address's budget.
+    Nothing is deducted from any bucket when one of them refuses. The
+    user bucket is keyed on the username the client authenticated as,
+    since anyone can setid another user's name, and clients that haven't
+    authenticated only have client and IP buckets.
+
+    Args:
+        client (tuple): (rate_limit, time_interval) of the per-client bucket.
+        user (tuple): (rate_limit, time_interval) of the per-user bucket.
+        ip (tuple): (rate_limit, time_interval) of the per-IP bucket.
+        costs (dict): Tokens charged per command; keep them below every rate_limit.
+    """
+
+    def __init__(self, client=(5, 1), user=(10, 1), ip=(20, 1), costs=None):
+        self.tiers = {
+            "client": WebSocketRateLimiter(*client),
+            "user": WebSocketRateLimiter(*user),
+            "ip": WebSocketRateLimiter(*ip),
+        }
+        self.costs = costs or {}
+
+    def cost(self, command):
+        return self.costs.get(command, 1)
+
+    async def acquire(self, client_id, username, ip, command):
+        """
+        Charge a command to every bucket it applies to.
+
+        Args:
+            client_id (str): The client's id.
+            username (str): The authenticated username, None if not logged in.
+            ip (str): The client's IP address, None if unknown.
+            command (str): The command being sent.
+
+        Returns:
+            str: None if allowed, otherwise the name of the tier that refused.
+        """
+        cost = self.cost(command)
+        now = time.monotonic()
+        buckets = []
+        for tier, key in (("client", client_id), ("user", username), ("ip", ip)):
+            # Clients that aren't logged in or have no known IP
+            if not key:
+                continue
+            limiter = self.tiers[tier]
+            limiter._tick(now)
+            bucket = limiter._bucket(key, now)
+            if bucket.tokens < cost:
+                return tier
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.tokens -= cost
+        return None
+
+    def remove(self, client_id):
+        # User and IP buckets outlive the connection on purpose
+        self.tiers["client"].remove(client_id)
+
+
+class SessionRegistry:
+    """
+    Authenticated sessions, keyed by client id with a reverse index by username.
+
+    A user can be logged in from several clients at once.
+    """
+
+    def __init__(self):
+        self.usernames = {}
+        self.clients = {}
+
+    def __contains__(self, client_id):
+        return client_id in self.usernames
+
+    def __getitem__(self, client_id):
+        return self.usernames[client_id]
+
+    def get(self, client_id, default=None):
+        return self.usernames.get(client_id, default)
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def add(self, client_id, username):
+        # Re-authenticating as someone else replaces the old session
+        self.remove(client_id)
+        self.usernames[client_id] = username
+        self.clients.setdefault(username, set()).add(client_id)
+
+    def remove(self, client_id):
+        username = self.usernames.pop(client_id, None)
+        if username is not None:
+            client_ids = self.clients[username]
+            client_ids.discard(client_id)
+            if not client_ids:
+                del self.clients[username]
+        return username
+
+    def sessions_of(self, username):
+        return self.clients.get(username, set())
+
+
+class RoomRegistry:
+    """
+    Chat room subscriptions: room -> subscribed clients, and the reverse.
+
+    Broadcasts for a room only go to its members, so their cost grows with
+    the room instead of with every connected client.
+    """
+
+    def __init__(self, max_rooms=32, max_name_length=64):
+        self.max_rooms = max_rooms
+        self.max_name_length = max_name_length
+        self.members = {}
+        self.rooms = {}
+
+    def valid(self, room):
+        return isinstance(room, str) and 0 < len(room) <= self.max_name_length
+
+    def subscribe(self, client, room):
+        """Add a client to a room. Returns False if it is in too many rooms."""
+        rooms = self.rooms.setdefault(client, set())
+        if room not in rooms and len(rooms) >= self.max_rooms:
+            return False
+        rooms.add(room)
+        self.members.setdefault(room, set()).add(client)
+        return True
+
+    def unsubscribe(self, client, room):
+        self.rooms.get(client, set()).discard(room)
+        members = self.members.get(room)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del self.members[room]
 
-async def isAuthenticated(server, client, authenticated_clients):
-    if client.id not in authenticated_clients:
+    def remove(self, client):
+        for room in self.rooms.pop(client, set()):
+            members = self.members[room]
+            members.discard(client)
+            if not members:
+                del self.members[room]
+
+    def members_of(self, room):
+        return self.members.get(room, set())
+
+    def rooms_of(self, client):
+        return self.rooms.get(client, set())
+
+
+async def isAuthenticated(server, client, sessions, audit):
+    # audit is the server's OceanAuditLogger; a second logger on the same
+    # file would interleave its writes and rotations with the server's
+    if client.id not in sessions:
         try:
             server.send_packet_unicast(
                 client,
@@ -78,26 +287,52 @@ async def isAuthenticated(server, client, authenticated_clients):
 
 
 class Moderator:
-    def __init__(self, ml_enabled: bool = True):
-        self.ml_enabled = ml_enabled
+    API_URL = (
+        "https://api-inference.huggingface.co/models/s-nlp/roberta_toxicity_classifier"
+    )
 
-    async def moderate(self, text: str) -> bool | str | None:
-        if self.ml_enabled:
-            API_URL = "https://api-inference.huggingface.co/models/s-nlp/roberta_toxicity_classifier"
-            headers = {"Authorization": "Bearer " + HF_TOKEN}
+    def __init__(
+        self,
+        ml_enabled: bool = True,
+        wordlist: str | None = None,
+        ml_options: dict | None = None,
+        ml_backend: str = "remote",
+        local_model: str = "moderation.npz",
+        local_threshold: float = 0.6,
+    ):
+        self.ml_enabled = ml_enabled
+        self.wordlist = wordlist
+        # Build the censor word set once instead of on every post
+        self.profanity = ProfanityFilter(wordlist)
+        self.ml_client = None
+        self.local_model = None
+        self.local_threshold = local_threshold
+        if ml_enabled and ml_backend == "local":
+            # NumPy is only needed for the local backend
+            from localmoderation import LocalToxicityModel
 
-            payload = {
-                "inputs": text,
-            }
+            self.local_model = LocalToxicityModel.load(local_model)
+            Info(f"Loaded local moderation model {local_model}")
+        elif ml_enabled:
+            self.ml_client = MLModerationClient(
+                self.API_URL, HF_TOKEN, **(ml_options or {})
+            )
 
-            response = requests.post(API_URL, headers=headers, json=payload)
-            data = response.json()
+    def reload_words(self, wordlist: str | None = None, whitelist: list | None = None):
+        """Reload the censor words, from a file if given, else the default list."""
+        self.wordlist = wordlist or self.wordlist
+        if self.wordlist:
+            self.profanity.load_censor_words_from_file(
+                self.wordlist, whitelist_words=whitelist
+            )
+        else:
+            self.profanity.load_censor_words(whitelist_words=whitelist)
+        Info(f"Loaded {len(self.profanity.CENSOR_WORDSET)} censor words")
 
-            if data and isinstance(data, list) and len(data) > 0:
-                result = data[0]
-                if isinstance(result, list) and len(result) > 0:
-                    toxicity_score = result[0].get("score", 0)
-                    return toxicity_score <= 0.6
+    async def moderate(self, text: str) -> bool | str | None:
+        if self.local_model is not None:
+            return self.local_model.score(text) <= self.local_threshold
+        if self.ml_enabled:
+            return await self.ml_client.is_allowed(text)  # type: ignore
         else:
-            profanity.load_censor_words()
-            return profanity.censor(text)
+            return self.profanity.censor(text)